@@ -1,17 +1,38 @@
+import os
+import click
 from flask import Flask
 from flask_login import LoginManager
+from flask_migrate import Migrate
 from app.config import Config
 
 # Import db from models to avoid circular imports
 from app.models import db
 
 login_manager = LoginManager()
+migrate = Migrate()
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    if not app.config['SALES_ARCHIVE_DIR']:
+        app.config['SALES_ARCHIVE_DIR'] = os.path.join(app.instance_path, 'archive')
+    if not app.config['ASSETS_DIST_DIR']:
+        app.config['ASSETS_DIST_DIR'] = os.path.join(app.static_folder, 'dist')
+    
+    # Each replica becomes a bind that only reads from read_replica views use
+    from app.replicas import REPLICA_BIND_PREFIX
+    app.config['SQLALCHEMY_BINDS'] = {
+        **app.config.get('SQLALCHEMY_BINDS', {}),
+        **{f'{REPLICA_BIND_PREFIX}{index}': url for index, url in enumerate(app.config['REPLICA_DATABASE_URLS'])}
+    }
+    
+    # Tuned engine options for the database in use, before the engines are made
+    from app.engine_profiles import configure_engine_profile, install_engine_profile
+    engine_hook = configure_engine_profile(app)
     db.init_app(app)
+    install_engine_profile(app, db, engine_hook)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(__file__), 'migrations'), render_as_batch=True)
     login_manager.init_app(app)
     login_manager.login_view = 'login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -21,9 +42,171 @@ def create_app():
     
     register_routes(app)
     
+    from app.metrics import init_metrics
+    init_metrics(app)
+    
+    from app.replicas import init_replicas
+    init_replicas(app)
+    
+    from app.assets import init_assets
+    init_assets(app)
+    
+    from app.receipts import ReceiptRenderer
+    app.extensions['receipts'] = ReceiptRenderer(app)
+    
+    # Warm the product typeahead index; if the tables do not exist yet it is
+    # built on the first search instead
+    from app.search import product_index
+    from sqlalchemy.exc import SQLAlchemyError
+    product_index.max_age = app.config['PRODUCT_INDEX_MAX_AGE']
+    with app.app_context():
+        try:
+            product_index.build()
+        except SQLAlchemyError:
+            product_index.invalidate()
+    
+    from app.cache import response_cache
+    response_cache.max_bytes = app.config['RESPONSE_CACHE_MAX_BYTES']
+    response_cache.counter_lag = app.config['RESPONSE_CACHE_COUNTER_LAG']
+    
+    from app.jobs import job_runner
+    job_runner.configure(app)
+    if app.config['JOBS_IN_PROCESS']:
+        # Started on the first request so each forked worker gets its own threads
+        app.before_request(job_runner.start)
+    
+    from app.passwords import password_hasher
+    password_hasher.configure(app)
+    
+    from app.live import live_broker
+    live_broker.configure(app)
+    
+    from app.user_cache import user_cache
+    user_cache.configure(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_URL'])
+    
     @login_manager.user_loader
     def load_user(user_id):
-        return models.User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
+    
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the dashboard sales rollups from the sales history."""
+        from app.rollups import rebuild_rollups
+        days, products = rebuild_rollups()
+        print(f'Rebuilt rollups for {days} day(s) and {products} product(s).')
+    
+    @app.cli.command('check-stock')
+    @click.option('--repair', is_flag=True, help='Rewrite drifted counters from the stock ledger.')
+    def check_stock_command(repair):
+        """Verify each product's on-hand quantity against the stock ledger."""
+        from app.inventory import check_stock
+        mismatches = check_stock(repair=repair)
+        for product_id, name, recorded, actual in mismatches:
+            print(f'Product {product_id} ({name}): recorded {recorded}, actual {actual}')
+        if not mismatches:
+            print('All on-hand quantities match the stock ledger.')
+        elif repair:
+            print(f'Repaired {len(mismatches)} product(s).')
+    
+    @app.cli.command('rebuild-alerts')
+    def rebuild_alerts_command():
+        """Re-evaluate the low-stock alert of every product with a reorder level."""
+        from app.alerts import rebuild_alerts
+        raised, cleared = rebuild_alerts()
+        print(f'Raised {raised} and cleared {cleared} low-stock alert(s).')
+    
+    @app.cli.command('snapshot-stock')
+    def snapshot_stock_command():
+        """Snapshot on-hand quantities so ledger reads replay fewer movements."""
+        from app.inventory import take_snapshots
+        print(f'Took {take_snapshots()} snapshot(s).')
+    
+    @app.cli.command('stock-at')
+    @click.argument('when', type=click.DateTime())
+    def stock_at_command(when):
+        """Print each product's on-hand quantity and FIFO value at a past date."""
+        from app.inventory import ledger_on_hand, fifo_valuation
+        on_hand = ledger_on_hand(as_of=when)
+        values = fifo_valuation(as_of=when)
+        names = dict(db.session.query(models.Product.id, models.Product.name))
+        for product_id, quantity in sorted(on_hand.items()):
+            if quantity:
+                print(f'{product_id:>6}  {names[product_id][:40]:<40}  {quantity:>8}  KES {values.get(product_id, 0):,.2f}')
+        print(f'Total: {sum(on_hand.values())} units, KES {sum(values.values()):,.2f} at cost')
+    
+    @app.cli.command('archive-sales')
+    @click.option('--keep-months', type=int, default=None, help='Full months to keep in the tables (default SALES_HOT_MONTHS).')
+    def archive_sales_command(keep_months):
+        """Move closed months of sales into compressed files in SALES_ARCHIVE_DIR."""
+        from app.archive import archive_sales
+        if keep_months is None:
+            keep_months = app.config['SALES_HOT_MONTHS']
+        results = archive_sales(keep_months)
+        for month, sales, items in results:
+            print(f'{month:%Y-%m}: archived {sales} sale(s) and {items} item(s)')
+        if not results:
+            print('Nothing to archive.')
+    
+    @app.cli.command('run-jobs')
+    def run_jobs_command():
+        """Run background jobs in the foreground until interrupted."""
+        import time
+        job_runner.start()
+        print(f'Running jobs as {job_runner.worker_id} with {job_runner.workers} worker(s); Ctrl+C to stop.')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print('Finishing jobs in progress...')
+            job_runner.stop()
+    
+    @app.cli.command('prune-jobs')
+    @click.option('--days', type=int, default=7, help='Keep finished jobs for this many days.')
+    def prune_jobs_command(days):
+        """Delete finished and failed background jobs older than --days."""
+        from app.jobs import prune_jobs
+        print(f'Deleted {prune_jobs(days)} job(s).')
+    
+    @app.cli.command('sync-replicas')
+    def sync_replicas_command():
+        """Copy a SQLite database over its SQLite replicas (for trying replicas out locally)."""
+        from app.replicas import sync_sqlite_replicas
+        for path in sync_sqlite_replicas():
+            print(f'Copied to {path}')
+    
+    @app.cli.command('vendor-assets')
+    @click.option('--refresh', is_flag=True, help='Download every file again, not just missing ones.')
+    def vendor_assets_command(refresh):
+        """Download the pinned third-party CSS, JS and fonts into app/static/vendor."""
+        from app.assets import vendor_assets
+        written = vendor_assets(app, refresh=refresh)
+        for path in written:
+            print(f'Downloaded {path}')
+        if not written:
+            print('All vendored assets are present.')
+    
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Bundle, fingerprint and precompress the static assets into ASSETS_DIST_DIR."""
+        from app.assets import AssetBuilder, assets
+        builder = AssetBuilder(app)
+        for name, built in sorted(builder.build().items()):
+            print(f'{name} -> {built}')
+        if builder.brotli is None:
+            print('brotli is not installed; wrote gzip variants only.')
+        assets.load()
+    
+    @app.cli.command('check-indexes')
+    def check_indexes_command():
+        """EXPLAIN the hot queries and fail if any of them skips its index."""
+        from app.query_plans import check_query_plans
+        results = check_query_plans()
+        for name, index, plan, uses_index in results:
+            print(f'[{"ok" if uses_index else "MISSING"}] {name} -> {index}')
+            if not uses_index:
+                print('    ' + plan.replace('\n', '\n    '))
+        if not all(result[3] for result in results):
+            raise SystemExit(1)
     
     return app
 
@@ -0,0 +1,69 @@
+from datetime import datetime
+from sqlalchemy import delete, insert
+from app.models import db, Product, StockAlert
+
+
+def parse_reorder_level(value):
+    """Reorder level from a form or CSV field: blank for none, else a whole number >= 0."""
+    if value is None or not str(value).strip():
+        return None
+    level = int(value)
+    if level < 0:
+        raise ValueError('Reorder level must be 0 or more.')
+    return level
+
+
+def update_alerts(product_ids):
+    """Raise or clear the low-stock alerts of the given products.
+
+    Call after changing their quantity or reorder level, in the same
+    transaction, so the work is proportional to the products that changed
+    rather than the catalogue. Writers have updated (and so locked) the
+    product rows by then, which keeps two tills from raising the same alert.
+    The caller commits. Returns (raised, cleared) product ids.
+    """
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return [], []
+    rows = db.session.query(
+        Product.id, Product.quantity_on_hand, Product.reorder_level, StockAlert.product_id
+    ).outerjoin(StockAlert, StockAlert.product_id == Product.id).filter(Product.id.in_(product_ids)).all()
+
+    raised = [product_id for product_id, quantity, level, alerted in rows
+              if alerted is None and level is not None and quantity <= level]
+    cleared = [product_id for product_id, quantity, level, alerted in rows
+               if alerted is not None and (level is None or quantity > level)]
+    if raised:
+        now = datetime.utcnow()
+        db.session.execute(insert(StockAlert), [{'product_id': product_id, 'raised_at': now} for product_id in raised])
+    if cleared:
+        db.session.execute(delete(StockAlert).where(StockAlert.product_id.in_(cleared)))
+    return raised, cleared
+
+
+def low_stock():
+    """Products currently at or below their reorder level, emptiest first.
+
+    Reads only the alert rows and their products, however big the catalogue.
+    """
+    rows = db.session.query(
+        Product.id, Product.name, Product.quantity_on_hand, Product.reorder_level, StockAlert.raised_at
+    ).select_from(StockAlert).join(Product, StockAlert.product_id == Product.id).order_by(
+        Product.quantity_on_hand - Product.reorder_level, Product.name
+    ).all()
+    return [{
+        'id': product_id,
+        'name': name,
+        'quantity_on_hand': quantity_on_hand,
+        'reorder_level': reorder_level,
+        'raised_at': raised_at.isoformat()
+    } for product_id, name, quantity_on_hand, reorder_level, raised_at in rows]
+
+
+def rebuild_alerts():
+    """Re-evaluate every watched or alerted product (for backfills and repairs). Commits; returns (raised, cleared)."""
+    watched = db.session.query(Product.id).filter(Product.reorder_level.isnot(None))
+    alerted = db.session.query(StockAlert.product_id)
+    raised, cleared = update_alerts([row[0] for row in watched.union(alerted)])
+    db.session.commit()
+    return len(raised), len(cleared)
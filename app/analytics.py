@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import func
+from app.models import db, Product, Sale, SaleItem
+from app.archive import archived_item_columns
+
+# Share of revenue covered by class A products, and by A and B together
+ABC_THRESHOLDS = (0.8, 0.95)
+
+
+def _day_index(days, start):
+    return (np.asarray(days, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+
+
+def daily_demand(product_ids, start, end):
+    """Units sold and revenue per product per day over the dates [start, end).
+
+    Returns two arrays of shape (len(product_ids), days); product_ids must be
+    sorted. The hot tables are summed per product and day by the database,
+    so only one row per product per day crosses the wire; archived months
+    are added straight from their column files. Sales of products that no
+    longer exist are ignored.
+    """
+    days = (end - start).days
+    cells = len(product_ids) * days
+    units = np.zeros(cells)
+    revenue = np.zeros(cells)
+
+    def add(rows_product_id, rows_day, rows_units, rows_revenue):
+        rows_product_id = np.asarray(rows_product_id, dtype=np.int64)
+        rows = np.searchsorted(product_ids, rows_product_id)
+        known = (rows < len(product_ids)) & (product_ids[np.minimum(rows, len(product_ids) - 1)] == rows_product_id)
+        flat = rows[known] * days + rows_day[known]
+        units[:] += np.bincount(flat, weights=np.asarray(rows_units, dtype=np.float64)[known], minlength=cells)
+        revenue[:] += np.bincount(flat, weights=np.asarray(rows_revenue, dtype=np.float64)[known], minlength=cells)
+
+    if not cells:
+        return units.reshape(0, days), revenue.reshape(0, days)
+
+    window = datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+    for product_id, created_at, quantity, unit_price in archived_item_columns(*window):
+        add(product_id, _day_index(created_at, start), quantity, quantity * unit_price)
+
+    sale_date = func.date(Sale.created_at)
+    rows = db.session.query(
+        SaleItem.product_id,
+        sale_date,
+        func.sum(SaleItem.quantity),
+        func.sum(SaleItem.quantity * SaleItem.unit_price)
+    ).join(Sale, SaleItem.sale_id == Sale.id).filter(
+        Sale.created_at >= window[0],
+        Sale.created_at < window[1]
+    ).group_by(SaleItem.product_id, sale_date).all()
+    if rows:
+        product_id, sold_on, quantity, amount = zip(*rows)
+        # SQLite's date() returns text, which numpy parses as well as dates
+        add(product_id, _day_index([str(day) for day in sold_on], start), quantity, amount)
+
+    return units.reshape(len(product_ids), days), revenue.reshape(len(product_ids), days)
+
+
+def abc_classes(revenue):
+    """Classify products by their share of total revenue, largest first.
+
+    A product is in class A while the revenue of the products ranked above
+    it is below the first threshold (so the product that crosses it is still
+    A), likewise B; the rest, and anything that sold nothing, is C.
+    """
+    classes = np.full(len(revenue), 'C')
+    total = revenue.sum()
+    if not total:
+        return classes
+    order = np.argsort(-revenue, kind='stable')
+    before = (np.cumsum(revenue[order]) - revenue[order]) / total
+    ranked = np.where(before < ABC_THRESHOLDS[0], 'A', np.where(before < ABC_THRESHOLDS[1], 'B', 'C'))
+    classes[order] = np.where(revenue[order] > 0, ranked, 'C')
+    return classes
+
+
+def forecast(units, revenue, active_days, on_hand, price, unit_margin,
+             lead_time_days, cover_days, safety_factor):
+    """Vectorised per-product statistics from a (products, days) demand matrix.
+
+    active_days is how many days of the window each product has been on sale
+    for, so new products are not undersold. The reorder point is lead-time
+    demand plus safety stock (safety_factor standard deviations of daily
+    demand over the lead time); at or below it the suggestion tops stock up
+    to cover_days of demand beyond the lead time. Returns a dict of arrays.
+    """
+    active_days = np.maximum(active_days, 1)
+    sold = units.sum(axis=1)
+    velocity = sold / active_days
+    variance = np.maximum((units ** 2).sum(axis=1) / active_days - velocity ** 2, 0)
+    safety_stock = safety_factor * np.sqrt(variance * lead_time_days)
+
+    reorder_point = velocity * lead_time_days + safety_stock
+    order_up_to = velocity * (lead_time_days + cover_days) + safety_stock
+    needs_reorder = (velocity > 0) & (on_hand <= reorder_point)
+    reorder_quantity = np.where(needs_reorder, np.maximum(np.ceil(order_up_to - on_hand), 0), 0)
+
+    days_of_cover = np.full(len(sold), np.inf)
+    np.divide(on_hand, velocity, out=days_of_cover, where=velocity > 0)
+    margin_pct = np.zeros(len(sold))
+    np.divide(unit_margin * 100, price, out=margin_pct, where=price > 0)
+
+    product_revenue = revenue.sum(axis=1)
+    return {
+        'units_sold': sold,
+        'revenue': product_revenue,
+        'velocity': velocity,
+        'unit_margin': unit_margin,
+        'margin_pct': margin_pct,
+        'gross_margin': sold * unit_margin,
+        'abc_class': abc_classes(product_revenue),
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point,
+        'reorder_quantity': reorder_quantity.astype(np.int64)
+    }
+
+
+def reorder_report(window_days, lead_time_days, cover_days, safety_factor, today=None):
+    """Sales velocity, margin, ABC class, days of cover and a suggested
+    reorder quantity for every product, over the window_days complete days
+    before today.
+
+    Returns {'start', 'end', 'products': [...], 'summary': {...}}, products
+    ordered by revenue. Days of cover is None for products that did not sell.
+    """
+    end = today or date.today()
+    start = end - timedelta(days=window_days)
+
+    products = Product.query.order_by(Product.id).all()
+    count = len(products)
+    product_ids = np.fromiter((product.id for product in products), np.int64, count)
+    on_hand = np.fromiter((product.get_total_stock() for product in products), np.float64, count)
+    price = np.fromiter((product.price for product in products), np.float64, count)
+    unit_margin = np.fromiter((product.get_profit_per_unit() for product in products), np.float64, count)
+    created = np.array([product.created_at or start for product in products], dtype='datetime64[D]')
+
+    units, revenue = daily_demand(product_ids, start, end)
+    # A product counts as on sale from its creation or its first sale in the
+    # window, whichever came first (imports and backdated sales can precede it)
+    first_sale = np.where(units.any(axis=1), np.argmax(units > 0, axis=1), window_days)
+    on_sale_from = np.minimum(np.maximum(_day_index(created, start), 0), first_sale)
+    active_days = np.clip(window_days - on_sale_from, 1, window_days)
+    stats = forecast(units, revenue, active_days, on_hand, price, unit_margin,
+                     lead_time_days, cover_days, safety_factor)
+
+    rows = []
+    for index in np.argsort(-stats['revenue'], kind='stable').tolist():
+        product = products[index]
+        cover = stats['days_of_cover'][index]
+        rows.append({
+            'id': product.id,
+            'name': product.name,
+            'stock': int(on_hand[index]),
+            'units_sold': int(stats['units_sold'][index]),
+            'revenue': round(float(stats['revenue'][index]), 2),
+            'velocity': round(float(stats['velocity'][index]), 3),
+            'unit_margin': round(float(stats['unit_margin'][index]), 2),
+            'margin_pct': round(float(stats['margin_pct'][index]), 1),
+            'gross_margin': round(float(stats['gross_margin'][index]), 2),
+            'abc_class': str(stats['abc_class'][index]),
+            'days_of_cover': round(float(cover), 1) if np.isfinite(cover) else None,
+            'reorder_point': round(float(stats['reorder_point'][index]), 1),
+            'reorder_quantity': int(stats['reorder_quantity'][index])
+        })
+
+    classes = stats['abc_class']
+    summary = {
+        'products': count,
+        'to_reorder': int(np.count_nonzero(stats['reorder_quantity'])),
+        'revenue': round(float(stats['revenue'].sum()), 2),
+        'gross_margin': round(float(stats['gross_margin'].sum()), 2),
+        'classes': {
+            label: {
+                'products': int(np.count_nonzero(classes == label)),
+                'revenue': round(float(stats['revenue'][classes == label].sum()), 2)
+            }
+            for label in 'ABC'
+        }
+    }
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'products': rows, 'summary': summary}
@@ -0,0 +1,304 @@
+import os
+import re
+import tempfile
+from datetime import date, datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert
+from app.models import db, ArchivedSaleKey, Customer, Product, Sale, SaleItem
+
+# Closed months of sales live in one compressed file per month, one array per
+# column, e.g. sales-2025-01.npz holding sale.* and sale_item.* arrays.
+# Null customer ids are stored as 0 and null idempotency keys as ''.
+SALE_FIELDS = ('id', 'customer_id', 'total_amount', 'total_profit', 'created_at', 'idempotency_key')
+SALE_ITEM_FIELDS = ('id', 'sale_id', 'product_id', 'quantity', 'unit_price', 'total_price')
+# Sale ids per statement when reading items and deleting archived rows,
+# well inside SQLite's limit on bound parameters
+ID_CHUNK_SIZE = 500
+
+_FILE_RE = re.compile(r'^sales-(\d{4})-(\d{2})\.npz$')
+
+
+def archive_dir():
+    return current_app.config['SALES_ARCHIVE_DIR']
+
+
+def _month_path(month):
+    return os.path.join(archive_dir(), f'sales-{month:%Y-%m}.npz')
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _as_datetime(month):
+    return datetime(month.year, month.month, 1)
+
+
+def archived_months():
+    """Return the first day of every archived month, oldest first."""
+    directory = archive_dir()
+    if not os.path.isdir(directory):
+        return []
+    months = []
+    for name in os.listdir(directory):
+        match = _FILE_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def hot_since():
+    """First day after the newest archived month, or None if nothing is archived."""
+    months = archived_months()
+    return _next_month(months[-1]) if months else None
+
+
+def load_month(month):
+    with np.load(_month_path(month)) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _columns(rows, fields, prefix):
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    arrays = {}
+    for field, values in zip(fields, columns):
+        if field == 'created_at':
+            array = np.array(values, dtype='datetime64[us]')
+        elif field == 'idempotency_key':
+            array = np.array([value or '' for value in values], dtype=str)
+        elif field in ('total_amount', 'total_profit', 'unit_price', 'total_price'):
+            array = np.array(values, dtype=np.float64)
+        else:
+            array = np.array([value or 0 for value in values], dtype=np.int64)
+        arrays[f'{prefix}.{field}'] = array
+    return arrays
+
+
+def _merge(existing, new, prefix, order_fields):
+    """Append new rows to an existing month, dropping ids already archived."""
+    merged = {}
+    for name, array in new.items():
+        if existing and name in existing:
+            array = np.concatenate([existing[name], array])
+        merged[name] = array
+    _, first = np.unique(merged[f'{prefix}.id'], return_index=True)
+    order = np.lexsort([merged[f'{prefix}.{field}'][first] for field in reversed(order_fields)])
+    keep = first[order]
+    return {name: array[keep] for name, array in merged.items()}
+
+
+def _write_month(month, arrays):
+    directory = archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial archive
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        np.savez_compressed(handle, **arrays)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, _month_path(month))
+
+
+def archive_month(month):
+    """Move one month of sales and their items from the hot tables to its file.
+
+    The file is written (merged with any earlier archive of the same month)
+    before the rows are deleted, so a failure in between only leaves rows in
+    both places; they are de-duplicated by id the next time the month is
+    archived. Only the sales that were read are deleted: a backdated sale
+    committed meanwhile (e.g. from an offline till) stays in the table until
+    the next run. Their idempotency keys move to ArchivedSaleKey in the same
+    transaction as the delete. Commits; returns (sales, items) moved.
+    """
+    start, end = _as_datetime(month), _as_datetime(_next_month(month))
+    in_month = [Sale.created_at >= start, Sale.created_at < end]
+
+    sales = db.session.query(*(getattr(Sale, field) for field in SALE_FIELDS)).filter(*in_month).all()
+    if not sales:
+        return 0, 0
+    # Items of exactly those sales, so none of a sale committed since is archived without it
+    sale_ids = [sale[SALE_FIELDS.index('id')] for sale in sales]
+    items = []
+    for offset in range(0, len(sale_ids), ID_CHUNK_SIZE):
+        items.extend(db.session.query(*(getattr(SaleItem, field) for field in SALE_ITEM_FIELDS)).filter(
+            SaleItem.sale_id.in_(sale_ids[offset:offset + ID_CHUNK_SIZE])
+        ).all())
+
+    existing = load_month(month) if os.path.exists(_month_path(month)) else None
+    arrays = _merge(existing, _columns(sales, SALE_FIELDS, 'sale'), 'sale', ('created_at', 'id'))
+    arrays.update(_merge(existing, _columns(items, SALE_ITEM_FIELDS, 'sale_item'), 'sale_item', ('sale_id', 'id')))
+    _write_month(month, arrays)
+
+    keys = {sale[SALE_FIELDS.index('idempotency_key')]: sale[SALE_FIELDS.index('id')]
+            for sale in sales if sale[SALE_FIELDS.index('idempotency_key')]}
+    for offset in range(0, len(sale_ids), ID_CHUNK_SIZE):
+        chunk = sale_ids[offset:offset + ID_CHUNK_SIZE]
+        db.session.execute(delete(SaleItem).where(SaleItem.sale_id.in_(chunk)),
+                           execution_options={'synchronize_session': False})
+        db.session.execute(delete(Sale).where(Sale.id.in_(chunk)), execution_options={'synchronize_session': False})
+    _record_archived_keys(keys)
+    db.session.commit()
+    return len(sales), len(items)
+
+
+def _record_archived_keys(keys):
+    """Add {idempotency_key: sale_id} to ArchivedSaleKey, skipping keys it has."""
+    keys = dict(keys)
+    names = list(keys)
+    for offset in range(0, len(names), ID_CHUNK_SIZE):
+        for (key,) in db.session.query(ArchivedSaleKey.idempotency_key).filter(
+            ArchivedSaleKey.idempotency_key.in_(names[offset:offset + ID_CHUNK_SIZE])
+        ):
+            del keys[key]
+    if keys:
+        db.session.execute(insert(ArchivedSaleKey), [
+            {'idempotency_key': key, 'sale_id': sale_id} for key, sale_id in keys.items()
+        ])
+
+
+def recorded_sale_ids(keys):
+    """Map each of the given idempotency keys already used, by a hot or an
+    archived sale, to that sale's id."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    found = dict(db.session.query(ArchivedSaleKey.idempotency_key, ArchivedSaleKey.sale_id).filter(
+        ArchivedSaleKey.idempotency_key.in_(keys)
+    ))
+    found.update(db.session.query(Sale.idempotency_key, Sale.id).filter(Sale.idempotency_key.in_(keys)))
+    return found
+
+
+def archive_sales(keep_months, today=None):
+    """Archive every month that ended more than keep_months months ago.
+
+    Returns a list of (month, sales, items) for the months that had rows.
+    """
+    today = today or date.today()
+    cutoff = date(today.year, today.month, 1)
+    for _ in range(keep_months):
+        cutoff = date(cutoff.year - (cutoff.month == 1), (cutoff.month - 2) % 12 + 1, 1)
+
+    oldest = db.session.query(func.min(Sale.created_at)).filter(Sale.created_at < _as_datetime(cutoff)).scalar()
+    if oldest is None:
+        return []
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+
+    results = []
+    month = date(oldest.year, oldest.month, 1)
+    while month < cutoff:
+        sales, items = archive_month(month)
+        if sales:
+            results.append((month, sales, items))
+        month = _next_month(month)
+    return results
+
+
+def _months_between(start, end):
+    """Archived months overlapping the half-open datetime range [start, end)."""
+    return [
+        month for month in archived_months()
+        if (end is None or _as_datetime(month) < end) and (start is None or _as_datetime(_next_month(month)) > start)
+    ]
+
+
+def _in_range(created_at, start, end):
+    mask = np.ones(len(created_at), dtype=bool)
+    if start is not None:
+        mask &= created_at >= np.datetime64(start, 'us')
+    if end is not None:
+        mask &= created_at < np.datetime64(end, 'us')
+    return mask
+
+
+def archived_sales_rows(start=None, end=None):
+    """Yield archived sales in the export's column order, month by month."""
+    for month in _months_between(start, end):
+        data = load_month(month)
+        mask = _in_range(data['sale.created_at'], start, end)
+        customer_ids = data['sale.customer_id'][mask]
+        names = dict(db.session.query(Customer.id, Customer.name).filter(
+            Customer.id.in_(np.unique(customer_ids[customer_ids > 0]).tolist())
+        ))
+        for sale_id, created_at, customer_id, amount, profit in zip(
+            data['sale.id'][mask].tolist(),
+            data['sale.created_at'][mask].tolist(),
+            customer_ids.tolist(),
+            data['sale.total_amount'][mask].tolist(),
+            data['sale.total_profit'][mask].tolist()
+        ):
+            yield sale_id, created_at, customer_id or None, names.get(customer_id), amount, profit
+
+
+def _item_created_at(data):
+    # Items carry their sale's timestamp, looked up by sale id
+    order = np.argsort(data['sale.id'])
+    positions = order[np.searchsorted(data['sale.id'], data['sale_item.sale_id'], sorter=order)]
+    return data['sale.created_at'][positions]
+
+
+def archived_item_columns(start=None, end=None):
+    """Yield (product_id, created_at, quantity, unit_price) arrays of the
+    archived sale items in the range, one tuple per month."""
+    for month in _months_between(start, end):
+        data = load_month(month)
+        created_at = _item_created_at(data)
+        mask = _in_range(created_at, start, end)
+        yield (data['sale_item.product_id'][mask], created_at[mask],
+               data['sale_item.quantity'][mask], data['sale_item.unit_price'][mask])
+
+
+def archived_sale_item_rows(start=None, end=None):
+    """Yield archived sale items in the export's column order, month by month."""
+    for month in _months_between(start, end):
+        data = load_month(month)
+        created_at = _item_created_at(data)
+        mask = _in_range(created_at, start, end)
+        rows = np.lexsort([data['sale_item.id'][mask], data['sale_item.sale_id'][mask], created_at[mask]])
+
+        product_ids = data['sale_item.product_id'][mask]
+        names = dict(db.session.query(Product.id, Product.name).filter(
+            Product.id.in_(np.unique(product_ids).tolist())
+        ))
+        for item_id, sale_id, when, product_id, quantity, unit_price, total_price in zip(
+            data['sale_item.id'][mask][rows].tolist(),
+            data['sale_item.sale_id'][mask][rows].tolist(),
+            created_at[mask][rows].tolist(),
+            product_ids[rows].tolist(),
+            data['sale_item.quantity'][mask][rows].tolist(),
+            data['sale_item.unit_price'][mask][rows].tolist(),
+            data['sale_item.total_price'][mask][rows].tolist()
+        ):
+            yield item_id, sale_id, when, product_id, names.get(product_id), quantity, unit_price, total_price
+
+
+def archived_totals():
+    """Aggregate all archives for the rollups.
+
+    Returns ({date: [amount, profit, count]}, {product_id: [quantity, revenue]}).
+    """
+    daily = {}
+    per_product = {}
+    for month in archived_months():
+        data = load_month(month)
+        days, day_index = np.unique(data['sale.created_at'].astype('datetime64[D]'), return_inverse=True)
+        amounts = np.bincount(day_index, weights=data['sale.total_amount'], minlength=len(days))
+        profits = np.bincount(day_index, weights=data['sale.total_profit'], minlength=len(days))
+        counts = np.bincount(day_index, minlength=len(days))
+        for day, amount, profit, count in zip(days.tolist(), amounts.tolist(), profits.tolist(), counts.tolist()):
+            totals = daily.setdefault(day, [0, 0, 0])
+            totals[0] += amount
+            totals[1] += profit
+            totals[2] += count
+
+        quantities = data['sale_item.quantity']
+        products, product_index = np.unique(data['sale_item.product_id'], return_inverse=True)
+        sold = np.bincount(product_index, weights=quantities, minlength=len(products))
+        revenue = np.bincount(product_index, weights=quantities * data['sale_item.unit_price'], minlength=len(products))
+        for product_id, quantity, amount in zip(products.tolist(), sold.tolist(), revenue.tolist()):
+            totals = per_product.setdefault(product_id, [0, 0])
+            totals[0] += int(quantity)
+            totals[1] += amount
+    return daily, per_product
@@ -0,0 +1,256 @@
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import urllib.request
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+# Third-party files the templates use, committed under static/vendor so
+# neither a till nor an image build depends on a CDN. Each is pinned by the
+# version in its URL and by its SHA-384 (as used for Subresource Integrity),
+# which `flask vendor-assets` and `flask build-assets` check. Bootstrap
+# Icons' fonts sit next to its CSS, which refers to them by relative URL
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+        'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH'),
+    'vendor/bootstrap/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+        'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz'),
+    'vendor/bootstrap-icons/bootstrap-icons.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.2/font/bootstrap-icons.css',
+        'sha384-DeN988K4Vg0cDrUgVHjrVM0+ogMrXsv0AZYIH40/9VGpjC7zi8TFGdnPwL1EkU/T'),
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': (
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.2/font/fonts/bootstrap-icons.woff2',
+        'sha384-y5r+ostI7C9z10rGESu9juvIzyEq9fM7QoAQxIfugnCxYZz6CJ4vurBatbHs4fNm'),
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': (
+        'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.2/font/fonts/bootstrap-icons.woff',
+        'sha384-A+FZpymtfUyJQpDM6BBYcOzTVb54etzVQX4LlAdaUfJ1kJHad+q9UDgqdYMOIA4x'),
+    'vendor/datatables/dataTables.bootstrap5.min.css': (
+        'https://cdn.jsdelivr.net/npm/datatables.net-bs5@2.3.4/css/dataTables.bootstrap5.min.css',
+        'sha384-q6bAgUAsga3oT16XWJ1toXdKcHmBp45jM5roe3RCQ6dET9xGL89Qmpx4tJAI2pm2'),
+    'vendor/datatables/dataTables.min.js': (
+        'https://cdn.jsdelivr.net/npm/datatables.net@2.3.4/js/dataTables.min.js',
+        'sha384-P2nH3zirtVBNntofY7S1DdqHFTpdjNoaHi86nouO4o530GzB/yds/nQmYXO48Fxy'),
+    'vendor/datatables/dataTables.bootstrap5.min.js': (
+        'https://cdn.jsdelivr.net/npm/datatables.net-bs5@2.3.4/js/dataTables.bootstrap5.min.js',
+        'sha384-3BApNGXgbm9rg2kjIbaEVprAGb2B0n9QyLjBrH090WdkzZ3IiUv8RZoTh5uP8oWH'),
+    'vendor/jquery/jquery.min.js': (
+        'https://code.jquery.com/jquery-3.7.1.min.js',
+        'sha384-1H217gwSVyLSIfaLxHbE7dRb3v4mYCKbpQvzx0cegeju1MVsGrX5xXxAvs/HgeFs'),
+    'vendor/chartjs/chart.umd.min.js': (
+        'https://cdn.jsdelivr.net/npm/chart.js@4.5.1/dist/chart.umd.min.js',
+        'sha384-jb8JQMbMoBUzgWatfe6COACi2ljcDdZQ2OxczGA3bGNeWe+6DChMTBJemed7ZnvJ'),
+}
+
+# Each bundle is its sources concatenated in order, under static/
+BUNDLES = {
+    'app.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/bootstrap-icons/bootstrap-icons.css',
+        'vendor/datatables/dataTables.bootstrap5.min.css',
+        'css/style.css',
+    ],
+    'app.js': [
+        'vendor/jquery/jquery.min.js',
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+        'vendor/chartjs/chart.umd.min.js',
+        'vendor/datatables/dataTables.min.js',
+        'vendor/datatables/dataTables.bootstrap5.min.js',
+        'js/live.js',
+    ],
+    'landing.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/bootstrap-icons/bootstrap-icons.css',
+        'css/style.css',
+    ],
+    'landing.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+    ],
+}
+
+# Only text formats get .gz/.br variants; fonts and images are compressed already
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.ttf', '.eot'}
+# Built files are named by content, so they never change under the same URL
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_SOURCE_MAP_RE = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+
+
+def static_path(app, name):
+    return os.path.join(app.static_folder, *name.split('/'))
+
+
+def integrity(data):
+    """SHA-384 of data in Subresource Integrity form ('sha384-<base64>')."""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def check_vendored(app, name):
+    """Read a VENDOR file, raising if it is missing or not its pinned version."""
+    path = static_path(app, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{name} is missing; restore it from git or run `flask vendor-assets`.')
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    if integrity(data) != VENDOR[name][1]:
+        raise ValueError(f'{name} does not match its pinned checksum; restore it from git, '
+                         f'or update VENDOR in app/assets.py if it was upgraded on purpose.')
+    return data
+
+
+def vendor_assets(app, refresh=False):
+    """Download the VENDOR files that are missing (all of them with refresh),
+    refusing any whose checksum is not the pinned one. Returns the paths
+    written."""
+    written = []
+    for name, (url, expected) in VENDOR.items():
+        path = static_path(app, name)
+        if os.path.exists(path) and not refresh:
+            continue
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        if integrity(data) != expected:
+            raise ValueError(f'{url} has checksum {integrity(data)}, not the pinned {expected}.')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as handle:
+            handle.write(data)
+        os.replace(path + '.tmp', path)
+        written.append(path)
+    return written
+
+
+def _fingerprinted(name, data):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+class AssetBuilder:
+    """Writes bundles and the files their CSS refers to into the dist
+    directory under content-hashed names, with precompressed variants,
+    and records logical name -> built name in manifest.json."""
+
+    def __init__(self, app):
+        self.app = app
+        self.dist = app.config['ASSETS_DIST_DIR']
+        self.manifest = {}
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        self.brotli = brotli
+
+    def build(self):
+        if os.path.isdir(self.dist):
+            shutil.rmtree(self.dist)
+        os.makedirs(self.dist)
+        for bundle, sources in BUNDLES.items():
+            parts = []
+            for source in sources:
+                data = self._read(source)
+                data = _SOURCE_MAP_RE.sub('', data.decode('utf-8'))
+                if bundle.endswith('.css'):
+                    data = self._rewrite_urls(data, os.path.dirname(source))
+                parts.append(data)
+            # JS sources are separated so one missing a trailing semicolon cannot run into the next
+            self.manifest[bundle] = self._write(bundle, ('\n;\n' if bundle.endswith('.js') else '\n').join(parts).encode('utf-8'))
+        with open(os.path.join(self.dist, 'manifest.json'), 'w') as handle:
+            json.dump(self.manifest, handle, indent=2, sort_keys=True)
+        return self.manifest
+
+    def _rewrite_urls(self, css, base):
+        # Point relative url(...)s at fingerprinted copies next to the bundle
+        def replace(match):
+            target = match.group(2).strip()
+            if re.match(r'^(data:|[a-z]+:|/|#)', target):
+                return match.group(0)
+            name = os.path.normpath(os.path.join(base, target.split('?')[0].split('#')[0])).replace(os.sep, '/')
+            if name not in self.manifest:
+                self.manifest[name] = self._write(name, self._read(name))
+            return f'url("{os.path.basename(self.manifest[name])}")'
+        return _CSS_URL_RE.sub(replace, css)
+
+    def _read(self, name):
+        if name in VENDOR:
+            return check_vendored(self.app, name)
+        with open(static_path(self.app, name), 'rb') as handle:
+            return handle.read()
+
+    def _write(self, name, data):
+        built = os.path.basename(_fingerprinted(name, data))
+        path = os.path.join(self.dist, built)
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        if os.path.splitext(name)[1] in COMPRESSIBLE:
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if self.brotli is not None:
+                variants.append(('.br', self.brotli.compress(data, quality=11)))
+            for suffix, compressed in variants:
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as handle:
+                        handle.write(compressed)
+        return built
+
+
+class Assets:
+    """Resolves bundle names for the templates and serves built files.
+
+    Once `flask build-assets` has run, asset_urls('app.css') is the one
+    fingerprinted bundle, served with an immutable cache lifetime and as a
+    precompressed variant when the browser accepts it. Before that it lists
+    the bundle's sources, served from static/.
+    """
+
+    def __init__(self):
+        self.dist = None
+        self.manifest = {}
+
+    def configure(self, app):
+        self.dist = app.config['ASSETS_DIST_DIR']
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.dist, 'manifest.json')) as handle:
+                self.manifest = json.load(handle)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def urls(self, bundle):
+        built = self.manifest.get(bundle)
+        if built is not None:
+            return [url_for('asset', filename=built)]
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+    def send(self, filename):
+        path = safe_join(self.dist, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[name] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, name
+                break
+        response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+assets = Assets()
+
+
+def init_assets(app):
+    """Serve built assets at /assets/<name> and give templates asset_urls()."""
+    assets.configure(app)
+    app.add_url_rule('/assets/<path:filename>', 'asset', assets.send)
+    app.add_template_global(assets.urls, 'asset_urls')
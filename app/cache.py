@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response, Response
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.models import db, CacheVersion, Job, LiveEvent, Product
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping tables that no cached view reads
+UNTRACKED_TABLES = {CacheVersion.__tablename__, Job.__tablename__, LiveEvent.__tablename__}
+
+# Counter columns that every sale moves. Writes that change nothing else are
+# counted as '<table>.<column>' instead of the table, so catalogue edits and
+# stock movements retire cached pages separately
+COUNTER_COLUMNS = {Product.__tablename__: 'quantity_on_hand'}
+ON_HAND = f'{Product.__tablename__}.quantity_on_hand'
+
+
+def current_versions(entities):
+    """Return {entity: version} for the given table names (0 if never written)."""
+    if not entities:
+        return {}
+    rows = db.session.query(CacheVersion.entity, CacheVersion.version).filter(
+        CacheVersion.entity.in_(entities)
+    ).all()
+    versions = dict.fromkeys(entities, 0)
+    versions.update(rows)
+    return versions
+
+
+def bump_versions(entities, connection):
+    """Increment the counters for entities on connection, in its transaction."""
+    table = CacheVersion.__table__
+    for entity in sorted(entities):
+        result = connection.execute(
+            table.update().where(table.c.entity == entity).values(version=table.c.version + 1)
+        )
+        if result.rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(entity=entity, version=1))
+        except IntegrityError:
+            connection.execute(
+                table.update().where(table.c.entity == entity).values(version=table.c.version + 1)
+            )
+
+
+def touched_entity(table, columns):
+    """The entity a write to columns of table counts against: the table, or
+    '<table>.<column>' when it only moved that table's counter column."""
+    counter = COUNTER_COLUMNS.get(table)
+    if counter is not None and set(columns) == {counter}:
+        return f'{table}.{counter}'
+    return table
+
+
+class ResponseCache:
+    """Process-local LRU of rendered response bodies, bounded by total size.
+
+    Keys include the version of every table a view reads, so a write makes
+    the old entries unreachable and they simply age out. Versions of counter
+    entities may be held for up to counter_lag seconds (see lagged_version).
+    """
+
+    def __init__(self, max_bytes=50 * 1024 * 1024, counter_lag=0):
+        self.max_bytes = max_bytes
+        self.counter_lag = counter_lag
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counter_versions = {}
+
+    def lagged_version(self, entity, version):
+        """The version of a counter entity to key pages on: the one seen up to
+        counter_lag seconds ago, so a run of sales retires them once."""
+        now = time.monotonic()
+        with self._lock:
+            seen = self._counter_versions.get(entity)
+            if seen is None or version < seen[0] or now - seen[1] >= self.counter_lag:
+                seen = self._counter_versions[entity] = (version, now)
+            return seen[0]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, mimetype)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (old_body, _) = self._entries.popitem(last=False)
+                self._size -= len(old_body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._counter_versions.clear()
+
+
+response_cache = ResponseCache()
+
+
+def cached_view(*entities, counters=()):
+    """Serve a GET view from the response cache until one of entities changes.
+
+    The cache key (also sent as the ETag) covers the URL, the logged-in user
+    and the current versions of entities, so a cache hit costs one small
+    query and browsers revalidating with If-None-Match get a 304. Changes to
+    the counter entities in counters show up within the cache's counter_lag
+    instead. Requests with pending flash messages are always rendered fresh.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            versions = current_versions(entities + counters)
+            for entity in counters:
+                versions[entity] = response_cache.lagged_version(entity, versions[entity])
+            user_id = current_user.get_id() if current_user.is_authenticated else None
+            fingerprint = repr((request.endpoint, request.full_path, user_id, sorted(versions.items())))
+            etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                cached = response_cache.get(etag)
+                if cached is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response_cache.set(etag, response.get_data(), response.mimetype)
+                else:
+                    response = Response(cached[0], mimetype=cached[1])
+
+            response.set_etag(etag)
+            # Browsers keep the copy but must revalidate it on every use
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+# Every write records the tables it touched: ORM flushes, and bulk or Core
+# statements run through the session (imports, checkout, on-hand counters).
+# The counters are bumped once the transaction has committed, in a short
+# transaction of their own, so concurrent checkouts never wait on each
+# other's cache_version rows and no page is cached from uncommitted data.
+
+@event.listens_for(db.session, 'after_flush')
+def _record_flushed_tables(session, flush_context):
+    touched = session.info.setdefault('touched_tables', set())
+    for instance in session.new | session.deleted:
+        if instance.__table__.name not in UNTRACKED_TABLES:
+            touched.add(instance.__table__.name)
+    for instance in session.dirty:
+        if instance.__table__.name not in UNTRACKED_TABLES:
+            state = db.inspect(instance)
+            changed = [attr.key for attr in state.attrs if attr.history.has_changes()]
+            touched.add(touched_entity(instance.__table__.name, changed))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _record_statement_tables(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    statement = orm_execute_state.statement
+    if statement.table.name in UNTRACKED_TABLES:
+        return
+    entity = statement.table.name
+    if orm_execute_state.is_update:
+        entity = touched_entity(entity, [getattr(column, 'key', column) for column in statement._values or ()])
+    orm_execute_state.session.info.setdefault('touched_tables', set()).add(entity)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_touched_tables(session):
+    # Fired for savepoints too, whose writes are only committed with the rest
+    if session.in_nested_transaction():
+        return
+    touched = session.info.pop('touched_tables', None)
+    if not touched:
+        return
+    try:
+        with db.engine.begin() as connection:
+            bump_versions(touched, connection)
+    except SQLAlchemyError:
+        logger.exception('Could not bump the cache versions of %s; cached pages may be stale', ', '.join(sorted(touched)))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_touched_tables(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('touched_tables', None)
@@ -0,0 +1,177 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Product, Sale, SaleItem, StockMovement
+from app.alerts import update_alerts
+from app.archive import recorded_sale_ids
+from app.inventory import lock_inventory, record_movements
+from app.rollups import record_sale
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be sold; the message is shown to the cashier."""
+
+
+def _normalize_items(items):
+    """Merge duplicate cart lines and validate quantities, preserving order."""
+    quantities = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Each item needs a numeric product_id and quantity.')
+        if quantity <= 0:
+            raise CheckoutError(f'Invalid quantity for product {product_id}.')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def checkout(customer_id, items, idempotency_key=None, created_at=None):
+    """Record a sale for the given cart and take its units out of stock.
+
+    Products for the whole cart are loaded and locked with one query, and
+    the stock ledger and on-hand counters are written with one bulk
+    statement each, so the number of round trips does not grow with the
+    number of cart lines. Stock lots are never touched: FIFO depletion
+    follows from the ledger (see app.inventory.fifo_lots).
+    The caller owns the transaction and must commit or roll back.
+    """
+    if not items:
+        raise CheckoutError('No items in sale.')
+
+    quantities = _normalize_items(items)
+    product_ids = sorted(quantities)
+
+    lock_inventory()
+
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(product_ids)).order_by(Product.id)
+        .with_for_update().populate_existing()
+    }
+
+    # Validate stock and calculate totals
+    total_amount = 0
+    total_profit = 0
+    sale_items = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            raise CheckoutError(f'Product {product_id} not found.')
+
+        available_stock = product.quantity_on_hand
+        if quantity > available_stock:
+            raise CheckoutError(f'Insufficient stock for {product.name}. Available: {available_stock}')
+
+        total_price = product.price * quantity
+        total_amount += total_price
+        total_profit += (product.price - product.cost) * quantity
+        sale_items.append(SaleItem(
+            product_id=product_id,
+            quantity=quantity,
+            unit_price=product.price,
+            total_price=total_price
+        ))
+
+    # Create the sale and its items in one flush
+    sale = Sale(customer_id=customer_id, total_amount=total_amount, total_profit=total_profit,
+                idempotency_key=idempotency_key, created_at=created_at)
+    sale.items = sale_items
+    db.session.add(sale)
+    db.session.flush()
+
+    db.session.execute(
+        Product.__table__.update().where(Product.id == db.bindparam('pid')).values(
+            quantity_on_hand=Product.quantity_on_hand - db.bindparam('qty')
+        ),
+        [{'pid': product_id, 'qty': quantity} for product_id, quantity in quantities.items()]
+    )
+    for product_id in product_ids:
+        db.session.expire(products[product_id], ['quantity_on_hand'])
+    update_alerts(product_ids)
+
+    record_movements([
+        {'product_id': product_id, 'kind': StockMovement.SALE, 'quantity': -quantity,
+         'sale_id': sale.id, 'created_at': sale.created_at}
+        for product_id, quantity in quantities.items()
+    ])
+
+    # Keep the dashboard rollups in the same transaction as the sale
+    record_sale(sale, sale_items)
+
+    return sale
+
+
+def _parse_created_at(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise CheckoutError('created_at must be an ISO 8601 timestamp.')
+
+
+def ingest_sales(sales, commit_size=50):
+    """Record queued sales from an offline till, committing in groups.
+
+    Each sale is a dict shaped like the /sales/add payload plus an
+    idempotency_key and an optional created_at. Sales whose key has already
+    been recorded, including sales since moved to the archive, are reported
+    as duplicates instead of being sold twice.
+    Every sale runs in its own savepoint, so one bad sale does not undo the
+    rest of its group. Returns one result dict per input sale, in order.
+    """
+    results = []
+    group = []
+
+    def flush_group():
+        keys = [data.get('idempotency_key') for _, data in group if isinstance(data, dict) and data.get('idempotency_key')]
+        existing = recorded_sale_ids(keys)
+
+        lock_inventory()
+        group_results = []
+        for index, data in group:
+            if not isinstance(data, dict):
+                group_results.append({'index': index, 'status': 'error', 'message': 'Each sale must be a JSON object.'})
+                continue
+            key = data.get('idempotency_key')
+            result = {'index': index, 'idempotency_key': key}
+            if not key:
+                result.update(status='error', message='idempotency_key is required.')
+            elif key in existing:
+                result.update(status='duplicate', sale_id=existing[key])
+            else:
+                try:
+                    with db.session.begin_nested():
+                        sale = checkout(
+                            data.get('customer_id') or None,
+                            data.get('items', []),
+                            idempotency_key=key,
+                            created_at=_parse_created_at(data.get('created_at'))
+                        )
+                    existing[key] = sale.id
+                    result.update(status='created', sale_id=sale.id)
+                except IntegrityError:
+                    # Another request recorded the same key after our lookup
+                    existing_id = db.session.query(Sale.id).filter_by(idempotency_key=key).scalar()
+                    result.update(status='duplicate', sale_id=existing_id)
+                except Exception as e:
+                    result.update(status='error', message=str(e))
+            group_results.append(result)
+
+        db.session.commit()
+        results.extend(group_results)
+        group.clear()
+
+    try:
+        for index, data in enumerate(sales):
+            group.append((index, data))
+            if len(group) >= commit_size:
+                flush_group()
+        if group:
+            flush_group()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return results
@@ -1,7 +1,111 @@
 import os
+import tempfile
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'myduka-pos-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///myduka_pos.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Sales ingested through /sales/batch are committed in groups of this size
+    SALE_BATCH_COMMIT_SIZE = int(os.environ.get('SALE_BATCH_COMMIT_SIZE', 50))
+    # Rows inserted per batch by the CSV product and stock imports
+    CSV_IMPORT_BATCH_SIZE = int(os.environ.get('CSV_IMPORT_BATCH_SIZE', 1000))
+    # Seconds before a worker rebuilds its product search index from the database
+    PRODUCT_INDEX_MAX_AGE = int(os.environ.get('PRODUCT_INDEX_MAX_AGE', 300))
+    # Rendered PDF receipts are cached on disk and rendered by a small worker pool
+    RECEIPT_CACHE_DIR = os.environ.get('RECEIPT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'myduka_receipts')
+    RECEIPT_CACHE_MAX_BYTES = int(os.environ.get('RECEIPT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    RECEIPT_WORKERS = int(os.environ.get('RECEIPT_WORKERS', 2))
+    # Request/SQL instrumentation exposed at /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_DEBUG_HEADERS = os.environ.get('METRICS_DEBUG_HEADERS', '').lower() in ('1', 'true', 'yes')
+    METRICS_QUERY_LOG_THRESHOLD = int(os.environ.get('METRICS_QUERY_LOG_THRESHOLD', 50))
+    METRICS_SLOW_QUERY_SECONDS = float(os.environ.get('METRICS_SLOW_QUERY_SECONDS', 0.1))
+    METRICS_SLOW_QUERY_SAMPLES = int(os.environ.get('METRICS_SLOW_QUERY_SAMPLES', 50))
+    # Cache for the logged-in user; set USER_CACHE_URL (redis://...) to share it between workers
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL')
+    # Rendered pages and JSON kept per worker until the tables they read change
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+    # Seconds the stock figures on the cached products page and /api/products
+    # may trail sales by, so a busy till does not re-render them on every sale
+    RESPONSE_CACHE_COUNTER_LAG = float(os.environ.get('RESPONSE_CACHE_COUNTER_LAG', 10))
+    # Closed months of sales are moved to compressed files here (defaults to
+    # <instance>/archive), keeping this many recent full months in the tables
+    SALES_ARCHIVE_DIR = os.environ.get('SALES_ARCHIVE_DIR')
+    SALES_HOT_MONTHS = int(os.environ.get('SALES_HOT_MONTHS', 3))
+    # Sales analytics: days of history used for velocity, and how reorder
+    # suggestions are sized (supplier lead time, days of demand to stock up
+    # for, and safety stock in standard deviations of daily demand)
+    ANALYTICS_WINDOW_DAYS = int(os.environ.get('ANALYTICS_WINDOW_DAYS', 90))
+    REORDER_LEAD_TIME_DAYS = int(os.environ.get('REORDER_LEAD_TIME_DAYS', 7))
+    REORDER_COVER_DAYS = int(os.environ.get('REORDER_COVER_DAYS', 14))
+    REORDER_SAFETY_FACTOR = float(os.environ.get('REORDER_SAFETY_FACTOR', 1.65))
+    # Background jobs (app.jobs): worker threads per process, seconds between
+    # polls of the job table, how long a claimed job is leased before another
+    # worker may take it over, and retry backoff. Set JOBS_IN_PROCESS=0 to
+    # leave jobs to a dedicated `flask run-jobs` process
+    JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', '1').lower() in ('1', 'true', 'yes')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+    JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 10))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    # Seconds between stock snapshots, taken by a background job that stock
+    # writes queue; 0 leaves them to `flask snapshot-stock`
+    STOCK_SNAPSHOT_INTERVAL = int(os.environ.get('STOCK_SNAPSHOT_INTERVAL', 3600))
+    # Read replicas (comma-separated URLs) for the reporting pages and GET
+    # APIs; writes always go to SQLALCHEMY_DATABASE_URI. Replicas further
+    # behind than REPLICA_MAX_LAG_SECONDS are skipped, and a client that just
+    # wrote reads from the primary for REPLICA_STICKY_SECONDS
+    REPLICA_DATABASE_URLS = [url.strip() for url in os.environ.get('REPLICA_DATABASE_URLS', '').split(',') if url.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 2))
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    # Engine tuning by database (app.engine_profiles): 'auto' picks sqlite or
+    # postgres from the database URL, 'none' keeps SQLAlchemy's defaults
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'auto').lower()
+    # SQLite: WAL journaling plus these pragmas on every connection
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Postgres: each web process gets a pool for its request threads and
+    # background workers, capped so all WEB_PROCESSES together stay within
+    # DB_MAX_CONNECTIONS. The defaults follow the uwsgi-nginx image the
+    # dockerfile builds on (up to 16 single-threaded processes)
+    WEB_PROCESSES = int(os.environ.get('WEB_PROCESSES') or os.environ.get('UWSGI_PROCESSES') or 16)
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or os.environ.get('UWSGI_THREADS') or 1)
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 90))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000))
+    # Werkzeug hashing method and cost for new passwords ('scrypt:n:r:p' or
+    # 'pbkdf2:sha256:iterations'); older hashes are upgraded (or downgraded)
+    # on the next successful login. PASSWORD_VERIFY_WORKERS > 0 checks and
+    # rehashes passwords on that many threads per process instead of the
+    # request's
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS', 0))
+    # Fingerprinted, precompressed bundles written by `flask build-assets`
+    # (defaults to app/static/dist)
+    ASSETS_DIST_DIR = os.environ.get('ASSETS_DIST_DIR')
+    # Live updates (app.live): seconds between checks for events from other
+    # workers, keep-alive interval, how long one stream stays open before
+    # the page reconnects, and how long events are kept for reconnecting
+    # pages to catch up
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 1))
+    LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15))
+    LIVE_MAX_STREAM_SECONDS = int(os.environ.get('LIVE_MAX_STREAM_SECONDS', 300))
+    # Open streams allowed per process. A stream holds a request thread, so by
+    # default at most half of WEB_THREADS, leaving the rest for tills; that
+    # is none on single-threaded workers. The gevent worker in
+    # app/live_server.py, where a stream is only a greenlet, takes 500
+    LIVE_MAX_CONNECTIONS = int(os.environ.get('LIVE_MAX_CONNECTIONS') or WEB_THREADS // 2)
+    # Whether sales publish live events and pages listen for them; on by
+    # default when this process can stream. The image turns it on for its
+    # uWSGI workers, whose streams nginx sends to the gevent worker
+    LIVE_UPDATES = os.environ.get('LIVE_UPDATES', '1' if LIVE_MAX_CONNECTIONS else '0').lower() in ('1', 'true', 'yes')
+    LIVE_EVENT_RETENTION = int(os.environ.get('LIVE_EVENT_RETENTION', 3600))
@@ -0,0 +1,117 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_profile(config):
+    """WAL journaling so readers never block the till that is writing (and
+    vice versa), with a busy timeout instead of instant 'database is locked'
+    errors between workers, a larger page cache and memory-mapped reads.
+
+    Returns (engine options, connect hook).
+    """
+    pragmas = [
+        ('journal_mode', 'WAL'),
+        # NORMAL is safe in WAL mode: a power cut can lose the last commits, never corrupt
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative sizes are in KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('temp_store', 'MEMORY'),
+    ]
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    # The driver's own lock wait (seconds) is kept in step with busy_timeout
+    return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}, on_connect
+
+
+def postgres_pool(config):
+    """Connections per process: one per request thread and background worker,
+    capped so every web process together stays within DB_MAX_CONNECTIONS.
+    Returns (pool_size, max_overflow)."""
+    per_process = max(config['DB_MAX_CONNECTIONS'] // max(config['WEB_PROCESSES'], 1), 1)
+    wanted = config['WEB_THREADS'] + config['JOB_WORKERS'] + config['RECEIPT_WORKERS']
+    if wanted > per_process:
+        logger.warning('%s web processes need %s connections each but DB_MAX_CONNECTIONS allows %s; '
+                       'threads will queue for connections', config['WEB_PROCESSES'], wanted, per_process)
+    pool_size = min(wanted, per_process)
+    return pool_size, per_process - pool_size
+
+
+def postgres_profile(config):
+    """A pool sized to the worker count, with dead connections detected before
+    use and recycled periodically, and server-side timeouts so a runaway
+    query or an abandoned transaction cannot hold locks indefinitely.
+
+    Returns (engine options, connect hook).
+    """
+    pool_size, max_overflow = postgres_pool(config)
+    options = (f'-c statement_timeout={config["DB_STATEMENT_TIMEOUT_MS"]} '
+               f'-c idle_in_transaction_session_timeout={config["DB_IDLE_IN_TRANSACTION_TIMEOUT_MS"]}')
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': True,
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'connect_args': {'options': options, 'connect_timeout': 10, 'application_name': 'myduka-pos'},
+    }, None
+
+
+PROFILES = {
+    'sqlite': sqlite_profile,
+    'postgres': postgres_profile,
+}
+
+# Which dialect each profile's connect hook applies to
+PROFILE_DIALECTS = {
+    'sqlite': 'sqlite',
+    'postgres': 'postgresql',
+}
+
+
+def profile_name(config):
+    """The configured profile, with 'auto' resolved from the database URL ('none' if there is none)."""
+    name = config['DB_ENGINE_PROFILE']
+    if name != 'auto':
+        return name
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    return {'sqlite': 'sqlite', 'postgresql': 'postgres'}.get(backend, 'none')
+
+
+def configure_engine_profile(app):
+    """Merge the selected profile's engine options into SQLALCHEMY_ENGINE_OPTIONS
+    (options set there explicitly win). Call before db.init_app; returns the
+    connect hook for install_engine_profile."""
+    name = profile_name(app.config)
+    if name == 'none':
+        return None
+    if name not in PROFILES:
+        raise ValueError(f'Unknown DB_ENGINE_PROFILE {name!r}; expected auto, none or one of {", ".join(PROFILES)}.')
+
+    options, on_connect = PROFILES[name](app.config)
+    explicit = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    merged = {**options, **explicit}
+    if 'connect_args' in options and 'connect_args' in explicit:
+        merged['connect_args'] = {**options['connect_args'], **explicit['connect_args']}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = merged
+    return on_connect and (PROFILE_DIALECTS[name], on_connect)
+
+
+def install_engine_profile(app, db, hook):
+    """Attach a profile's connect hook to every engine of its dialect (call after db.init_app)."""
+    if hook is None:
+        return
+    dialect, on_connect = hook
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == dialect:
+                event.listen(engine, 'connect', on_connect)
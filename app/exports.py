@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from itertools import chain
+from datetime import datetime, timedelta
+from app.models import db, Customer, Product, Sale, SaleItem
+from app.archive import archived_sales_rows, archived_sale_item_rows
+
+# Rows fetched per round trip and written per chunk of the response body
+EXPORT_CHUNK_SIZE = 1000
+
+SALE_COLUMNS = ['sale_id', 'created_at', 'customer_id', 'customer_name', 'total_amount', 'total_profit']
+SALE_ITEM_COLUMNS = ['sale_item_id', 'sale_id', 'created_at', 'product_id', 'product_name',
+                     'quantity', 'unit_price', 'total_price']
+
+
+def parse_date_range(date_from, date_to):
+    """Turn inclusive YYYY-MM-DD bounds into a half-open datetime range."""
+    start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+    end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    return start, end
+
+
+def _date_filters(start, end):
+    filters = []
+    if start:
+        filters.append(Sale.created_at >= start)
+    if end:
+        filters.append(Sale.created_at < end)
+    return filters
+
+
+def sales_rows(start=None, end=None, include_archived=False):
+    """Sales in the range; with include_archived, archived months come first."""
+    query = db.session.query(
+        Sale.id,
+        Sale.created_at,
+        Sale.customer_id,
+        Customer.name,
+        Sale.total_amount,
+        Sale.total_profit
+    ).outerjoin(Customer, Sale.customer_id == Customer.id).filter(
+        *_date_filters(start, end)
+    ).order_by(Sale.created_at, Sale.id)
+    if include_archived:
+        return chain(archived_sales_rows(start, end), query.yield_per(EXPORT_CHUNK_SIZE))
+    return query.yield_per(EXPORT_CHUNK_SIZE)
+
+
+def sale_item_rows(start=None, end=None, include_archived=False):
+    """Sale items in the range; with include_archived, archived months come first."""
+    query = db.session.query(
+        SaleItem.id,
+        SaleItem.sale_id,
+        Sale.created_at,
+        SaleItem.product_id,
+        Product.name,
+        SaleItem.quantity,
+        SaleItem.unit_price,
+        SaleItem.total_price
+    ).join(Sale, SaleItem.sale_id == Sale.id).outerjoin(Product, SaleItem.product_id == Product.id).filter(
+        *_date_filters(start, end)
+    ).order_by(Sale.created_at, SaleItem.sale_id, SaleItem.id)
+    if include_archived:
+        return chain(archived_sale_item_rows(start, end), query.yield_per(EXPORT_CHUNK_SIZE))
+    return query.yield_per(EXPORT_CHUNK_SIZE)
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_csv(columns, rows):
+    """Yield a CSV document chunk by chunk, starting with the header."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(_jsonable(value) for value in row)
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(columns, rows):
+    """Yield one JSON object per line, grouped into chunks."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _jsonable(value) for column, value in zip(columns, row)}))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
@@ -0,0 +1,151 @@
+import csv
+import io
+from sqlalchemy import insert
+from app.models import db, Product, Stock, StockMovement
+from app.alerts import parse_reorder_level, update_alerts
+from app.inventory import record_movements
+
+# Only the first errors are kept in full so a bad file cannot exhaust memory
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.warnings = 0
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'message': message})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.error_count,
+            'warnings': self.warnings,
+            'errors': sorted(self.errors, key=lambda error: error['row'])
+        }
+
+
+def open_csv(file_storage):
+    """Wrap an uploaded file in a streaming DictReader (the upload is never read whole)."""
+    text = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return csv.DictReader(text)
+
+
+def _check_columns(reader, required):
+    missing = [column for column in required if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'Missing column(s): {", ".join(missing)}')
+
+
+def _parse_product(row):
+    # Same rules as the add_product route
+    name = (row.get('name') or '').strip()
+    cost = float(row.get('cost'))
+    price = float(row.get('price'))
+    if not name or cost < 0 or price < 0:
+        raise ValueError('Invalid input. All fields required and values must be non-negative.')
+    return {'name': name, 'cost': cost, 'price': price, 'reorder_level': parse_reorder_level(row.get('reorder_level'))}
+
+
+def _parse_stock(row):
+    # Same rules as the add_stock route
+    product_id = int(row.get('product_id'))
+    quantity = int(row.get('quantity'))
+    if quantity <= 0:
+        raise ValueError('Quantity must be greater than 0.')
+    return {'product_id': product_id, 'quantity': quantity}
+
+
+def import_products(reader, batch_size=1000):
+    """Insert products from a CSV with name, cost and price columns, and
+    optionally reorder_level."""
+    _check_columns(reader, ('name', 'cost', 'price'))
+    result = ImportResult()
+    batch = []
+
+    for row_number, row in enumerate(reader, start=2):
+        try:
+            product = _parse_product(row)
+        except (TypeError, ValueError) as e:
+            result.add_error(row_number, str(e))
+            continue
+        if product['price'] < product['cost']:
+            result.warnings += 1
+        batch.append(product)
+        if len(batch) >= batch_size:
+            result.imported += _insert_products(batch)
+
+    if batch:
+        result.imported += _insert_products(batch)
+    return result
+
+
+def _insert_products(batch):
+    products = db.session.execute(insert(Product).returning(Product.id, Product.reorder_level), batch).all()
+    # New products hold no stock, so any with a reorder level start out low
+    update_alerts(product_id for product_id, reorder_level in products if reorder_level is not None)
+    db.session.commit()
+    count = len(batch)
+    batch.clear()
+    return count
+
+
+def import_stock(reader, batch_size=1000):
+    """Insert stock receipts from a CSV with product_id and quantity columns."""
+    _check_columns(reader, ('product_id', 'quantity'))
+    result = ImportResult()
+    batch = []
+
+    for row_number, row in enumerate(reader, start=2):
+        try:
+            batch.append((row_number, _parse_stock(row)))
+        except (TypeError, ValueError) as e:
+            result.add_error(row_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            result.imported += _insert_stock(batch, result)
+
+    if batch:
+        result.imported += _insert_stock(batch, result)
+    return result
+
+
+def _insert_stock(batch, result):
+    product_ids = {stock['product_id'] for _, stock in batch}
+    costs = dict(db.session.query(Product.id, Product.cost).filter(Product.id.in_(product_ids)))
+
+    rows = []
+    deltas = {}
+    for row_number, stock in batch:
+        if stock['product_id'] not in costs:
+            result.add_error(row_number, f'Product {stock["product_id"]} not found.')
+            continue
+        rows.append(dict(stock, unit_cost=costs[stock['product_id']]))
+        deltas[stock['product_id']] = deltas.get(stock['product_id'], 0) + stock['quantity']
+
+    if rows:
+        # Counters first, so the product rows are locked before the ledger is appended to
+        db.session.execute(
+            Product.__table__.update().where(Product.id == db.bindparam('pid')).values(
+                quantity_on_hand=Product.quantity_on_hand + db.bindparam('qty')
+            ),
+            [{'pid': product_id, 'qty': quantity} for product_id, quantity in deltas.items()]
+        )
+        update_alerts(deltas)
+        lots = db.session.execute(
+            insert(Stock).returning(Stock.id, Stock.product_id, Stock.quantity, Stock.restock_date), rows
+        ).all()
+        record_movements([
+            {'product_id': product_id, 'kind': StockMovement.RECEIPT, 'quantity': quantity,
+             'stock_id': stock_id, 'created_at': restock_date}
+            for stock_id, product_id, quantity, restock_date in lots
+        ])
+        db.session.commit()
+
+    batch.clear()
+    return len(rows)
@@ -0,0 +1,263 @@
+import time
+from flask import current_app
+from sqlalchemy import and_, func, insert
+from app.models import db, Product, Stock, StockMovement, StockSnapshot
+from app.alerts import update_alerts
+from app.jobs import enqueue, handler
+
+_scheduled_at = None
+
+
+def lock_inventory():
+    """Serialize competing stock writers on databases without row locks.
+
+    Postgres gets SELECT ... FOR UPDATE on the rows themselves. SQLite has no
+    row locks, so the write lock is taken up front with BEGIN IMMEDIATE,
+    making a stock check and the write that depends on it atomic with respect
+    to other tills. If the connection is already inside a transaction the
+    lock will be taken on the first write instead.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    dbapi_connection = connection.connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def adjust_on_hand(product_id, delta):
+    """Atomically add delta to a product's on-hand counter and re-check its
+    low-stock alert.
+
+    Uses a single UPDATE so concurrent tills never lose each other's writes.
+    """
+    if delta:
+        Product.query.filter_by(id=product_id).update(
+            {Product.quantity_on_hand: Product.quantity_on_hand + delta},
+            synchronize_session='fetch'
+        )
+        update_alerts([product_id])
+
+
+def record_movements(rows):
+    """Append ledger rows (dicts of StockMovement columns) in one statement.
+
+    Writers update the product's on-hand counter before appending, so the
+    row lock taken by that UPDATE is held while the movement is inserted
+    (take_snapshots relies on this). Also queues the periodic snapshot job.
+    """
+    if rows:
+        db.session.execute(insert(StockMovement), rows)
+        schedule_snapshots()
+
+
+def schedule_snapshots():
+    """Queue a take_snapshots job in the current transaction, at most once
+    per STOCK_SNAPSHOT_INTERVAL across all processes."""
+    global _scheduled_at
+    interval = current_app.config['STOCK_SNAPSHOT_INTERVAL']
+    if not interval or (_scheduled_at is not None and time.monotonic() - _scheduled_at < interval):
+        return
+    _scheduled_at = time.monotonic()
+    enqueue('take_stock_snapshots', dedupe_key=f'take_stock_snapshots:{int(time.time() // interval)}')
+
+
+def inventory_totals():
+    """Return (total_units, value_at_cost, value_at_price) in one aggregate query."""
+    row = db.session.query(
+        func.sum(Product.quantity_on_hand),
+        func.sum(Product.cost * Product.quantity_on_hand),
+        func.sum(Product.price * Product.quantity_on_hand)
+    ).one()
+    return row[0] or 0, row[1] or 0, row[2] or 0
+
+
+def _latest_snapshots(as_of=None):
+    """Subquery of each product's newest snapshot (taken no later than as_of)."""
+    # A correlated max rather than a grouped join: SQLite materialises the
+    # grouped join without an index and scans it once per product
+    newer = db.aliased(StockSnapshot)
+    latest = db.session.query(func.max(newer.movement_id)).filter(newer.product_id == StockSnapshot.product_id)
+    if as_of is not None:
+        latest = latest.filter(newer.taken_at <= as_of)
+
+    return db.session.query(
+        StockSnapshot.product_id,
+        StockSnapshot.movement_id,
+        StockSnapshot.quantity,
+        StockSnapshot.first_open_lot_id
+    ).filter(StockSnapshot.movement_id == latest.scalar_subquery()).subquery()
+
+
+def ledger_on_hand(product_ids=None, as_of=None):
+    """On-hand quantity per product from the ledger: the latest snapshot plus
+    the movements recorded after it, optionally as of a past datetime.
+
+    Returns {product_id: quantity} for every product (or those in product_ids).
+    """
+    snapshots = _latest_snapshots(as_of)
+    movement_filter = [
+        StockMovement.product_id == Product.id,
+        StockMovement.id > func.coalesce(snapshots.c.movement_id, 0)
+    ]
+    if as_of is not None:
+        movement_filter.append(StockMovement.created_at <= as_of)
+
+    query = db.session.query(
+        Product.id,
+        func.coalesce(snapshots.c.quantity, 0) + func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).outerjoin(snapshots, snapshots.c.product_id == Product.id).outerjoin(
+        StockMovement, and_(*movement_filter)
+    ).group_by(Product.id, snapshots.c.quantity)
+    if product_ids is not None:
+        query = query.filter(Product.id.in_(product_ids))
+    return dict(query.all())
+
+
+def fifo_lots(product_ids=None, as_of=None):
+    """What is left of each stock lot, worked out FIFO from the ledger.
+
+    A lot's size is what it received less any write-offs against it. The
+    units a product has sold (or written off without naming a lot) are its
+    lot sizes minus its on-hand quantity, and they are taken from the oldest
+    lots first. Lots a product had used up by its latest snapshot (taken no
+    later than as_of) stay used up, so only the lots from its first open one
+    then are read. Returns {product_id: [(lot, remaining), ...]} in FIFO
+    order, leaving out lots that are used up.
+    """
+    snapshots = _latest_snapshots(as_of)
+    still_open = Stock.id >= func.coalesce(snapshots.c.first_open_lot_id, 0)
+    lots = Stock.query.options(db.joinedload(Stock.product)).outerjoin(
+        snapshots, snapshots.c.product_id == Stock.product_id
+    ).filter(still_open).order_by(Stock.product_id, Stock.restock_date, Stock.id)
+    write_offs = db.session.query(
+        StockMovement.stock_id,
+        func.sum(StockMovement.quantity)
+    ).join(Stock, Stock.id == StockMovement.stock_id).outerjoin(
+        snapshots, snapshots.c.product_id == Stock.product_id
+    ).filter(StockMovement.kind == StockMovement.ADJUSTMENT, still_open)
+    if product_ids is not None:
+        lots = lots.filter(Stock.product_id.in_(product_ids))
+        write_offs = write_offs.filter(StockMovement.product_id.in_(product_ids))
+    if as_of is not None:
+        lots = lots.filter(Stock.restock_date <= as_of)
+        write_offs = write_offs.filter(StockMovement.created_at <= as_of)
+    write_offs = dict(write_offs.group_by(StockMovement.stock_id).all())
+    on_hand = ledger_on_hand(product_ids, as_of)
+
+    sized = {}
+    for lot in lots:
+        sized.setdefault(lot.product_id, []).append((lot, lot.quantity + write_offs.get(lot.id, 0)))
+
+    result = {}
+    for product_id, product_lots in sized.items():
+        consumed = max(sum(size for _, size in product_lots) - on_hand.get(product_id, 0), 0)
+        position = 0
+        remaining_lots = []
+        for lot, size in product_lots:
+            remaining = min(size, max(position + size - consumed, 0))
+            position += size
+            if remaining > 0:
+                remaining_lots.append((lot, remaining))
+        result[product_id] = remaining_lots
+    return result
+
+
+def fifo_valuation(product_ids=None, as_of=None):
+    """Value of the remaining lots at their receipt cost, per product."""
+    return {
+        product_id: sum(remaining * (lot.unit_cost if lot.unit_cost is not None else lot.product.cost)
+                        for lot, remaining in lots)
+        for product_id, lots in fifo_lots(product_ids, as_of).items()
+    }
+
+
+def write_off_lot(stock_id):
+    """Remove what is left of a stock lot with an adjustment movement.
+
+    The lot itself is kept for history. Returns the number of units written
+    off. The caller commits.
+    """
+    lock_inventory()
+    lot = db.session.get(Stock, stock_id)
+    if lot is None:
+        return None
+    Product.query.filter_by(id=lot.product_id).with_for_update().one()
+    remaining = dict(fifo_lots([lot.product_id]).get(lot.product_id, [])).get(lot, 0)
+    if remaining:
+        adjust_on_hand(lot.product_id, -remaining)
+        record_movements([{
+            'product_id': lot.product_id,
+            'kind': StockMovement.ADJUSTMENT,
+            'quantity': -remaining,
+            'stock_id': lot.id
+        }])
+    return remaining
+
+
+def take_snapshots():
+    """Snapshot the on-hand quantity and first open lot of every product
+    with movements since its last snapshot, so ledger reads only replay
+    recent movements and open lots. Run by the take_stock_snapshots job.
+
+    Locks the products first so that no movement still being written can end
+    up below a snapshot's movement_id. Commits; returns the number of
+    snapshots taken.
+    """
+    lock_inventory()
+    db.session.query(Product.id).with_for_update(read=True).all()
+
+    snapshots = _latest_snapshots()
+    open_lots = fifo_lots()
+    last_lots = dict(db.session.query(Stock.product_id, func.max(Stock.id)).group_by(Stock.product_id).all())
+    pending = db.session.query(
+        StockMovement.product_id,
+        func.max(StockMovement.id),
+        func.coalesce(snapshots.c.quantity, 0) + func.sum(StockMovement.quantity)
+    ).outerjoin(snapshots, snapshots.c.product_id == StockMovement.product_id).filter(
+        StockMovement.id > func.coalesce(snapshots.c.movement_id, 0)
+    ).group_by(StockMovement.product_id, snapshots.c.quantity).all()
+
+    if pending:
+        db.session.execute(insert(StockSnapshot), [{
+            'product_id': product_id,
+            'movement_id': movement_id,
+            'quantity': quantity,
+            'first_open_lot_id': min(
+                (lot.id for lot, _ in open_lots.get(product_id, [])),
+                default=last_lots.get(product_id, 0) + 1
+            )
+        } for product_id, movement_id, quantity in pending])
+    db.session.commit()
+    return len(pending)
+
+
+@handler('take_stock_snapshots')
+def take_stock_snapshots_job():
+    # End the job's read transaction so the inventory lock is taken up front
+    db.session.commit()
+    take_snapshots()
+
+
+def check_stock(repair=False):
+    """Compare on-hand counters with the stock ledger.
+
+    Returns a list of (product_id, name, recorded, actual) for every product
+    that drifted. With repair=True the counters are rewritten and committed.
+    """
+    actual = ledger_on_hand()
+    mismatches = [
+        (product_id, name, recorded, actual.get(product_id, 0))
+        for product_id, name, recorded in db.session.query(Product.id, Product.name, Product.quantity_on_hand)
+        if recorded != actual.get(product_id, 0)
+    ]
+
+    if repair and mismatches:
+        db.session.execute(
+            Product.__table__.update().where(Product.id == db.bindparam('pid')).values(quantity_on_hand=db.bindparam('qty')),
+            [{'pid': row[0], 'qty': row[3]} for row in mismatches]
+        )
+        update_alerts(row[0] for row in mismatches)
+        db.session.commit()
+
+    return mismatches
@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.models import db, Job
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between two attempts of a failing job
+MAX_RETRY_DELAY = 3600
+
+_handlers = {}
+
+
+def handler(name):
+    """Register a function as the handler for jobs called name.
+
+    It is called with the job's payload as keyword arguments, inside an app
+    context and a transaction that is committed together with the job being
+    marked done, so its database writes happen once even if the job is run
+    again. Anything it does outside the database must be safe to repeat.
+    """
+    def decorator(function):
+        _handlers[name] = function
+        return function
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None, dedupe_key=None):
+    """Queue a job in the current transaction.
+
+    The job is only visible to workers once the caller commits, and vanishes
+    if it rolls back, so work is never lost or started for a write that did
+    not happen. With dedupe_key, a job already queued under the same key is
+    kept and no new one is added. The caller commits; returns the Job or None
+    for a duplicate.
+    """
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts or job_runner.max_attempts,
+        dedupe_key=dedupe_key
+    )
+    if dedupe_key is None:
+        db.session.add(job)
+        db.session.flush()
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.add(job)
+        except IntegrityError:
+            return None
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def _due(now):
+    # Pending jobs whose time has come, and running jobs whose lease ran out
+    return or_(
+        and_(Job.status == Job.PENDING, Job.run_at <= now),
+        and_(Job.status == Job.RUNNING, Job.locked_until < now)
+    )
+
+
+def claim_jobs(worker_id, limit, lease_seconds):
+    """Lease up to limit due jobs to worker_id and commit. Returns their ids.
+
+    Each job is taken with an UPDATE that re-checks it is still due, so when
+    several workers race for the same job only one of them gets it.
+    """
+    now = datetime.utcnow()
+    candidates = db.session.query(Job.id).filter(_due(now)).order_by(Job.run_at, Job.id).limit(limit).with_for_update(
+        skip_locked=True
+    ).all()
+
+    claimed = []
+    table = Job.__table__
+    for (job_id,) in candidates:
+        result = db.session.execute(table.update().where(table.c.id == job_id, _due(now)).values(
+            status=Job.RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=table.c.attempts + 1
+        ))
+        if result.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def _release(job_id, worker_id, **values):
+    # Only the worker holding the lease may finish a job
+    table = Job.__table__
+    result = db.session.execute(table.update().where(
+        table.c.id == job_id,
+        table.c.status == Job.RUNNING,
+        table.c.locked_by == worker_id
+    ).values(locked_by=None, locked_until=None, **values))
+    return result.rowcount == 1
+
+
+def run_job(job_id, worker_id, retry_delay):
+    """Run one claimed job and record the outcome.
+
+    On success the job is marked done in the same transaction as the
+    handler's writes; if the lease was lost in the meantime (another worker
+    took the job over) those writes are rolled back instead. A failure is
+    retried after retry_delay seconds, doubling with each attempt, until the
+    job runs out of attempts and is marked failed.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None or job.locked_by != worker_id:
+        db.session.rollback()
+        return
+    name, payload, attempts, max_attempts = job.name, job.payload, job.attempts, job.max_attempts
+
+    try:
+        function = _handlers.get(name)
+        if function is None:
+            raise LookupError(f'No handler registered for job {name!r}.')
+        function(**json.loads(payload))
+        if _release(job_id, worker_id, status=Job.DONE, finished_at=datetime.utcnow(), last_error=None):
+            db.session.commit()
+        else:
+            db.session.rollback()
+            logger.warning('Job %s (%s) lost its lease before finishing; its changes were discarded', job_id, name)
+        return
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+
+    if attempts >= max_attempts:
+        values = {'status': Job.FAILED, 'finished_at': datetime.utcnow()}
+        logger.error('Job %s (%s) failed after %s attempt(s)', job_id, name, attempts)
+    else:
+        delay = min(retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY) * random.uniform(0.8, 1.2)
+        values = {'status': Job.PENDING, 'run_at': datetime.utcnow() + timedelta(seconds=delay)}
+        logger.warning('Job %s (%s) failed (attempt %s of %s), retrying in %.0fs', job_id, name, attempts, max_attempts, delay)
+    _release(job_id, worker_id, last_error=error[-4000:], **values)
+    db.session.commit()
+
+
+def prune_jobs(older_than_days):
+    """Delete finished jobs older than the given age and commit. Returns the number deleted."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = Job.query.filter(Job.status.in_([Job.DONE, Job.FAILED]), Job.finished_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+    return deleted
+
+
+class JobRunner:
+    """Runs queued jobs on a bounded thread pool in this process.
+
+    A poller thread claims as many due jobs as there are idle workers, every
+    poll_interval seconds or as soon as a commit queues new work here. Every
+    process (each uWSGI worker, or a dedicated `flask run-jobs`) runs its own
+    runner; the job table is what they share, so a job is only ever run by
+    the one process that claimed it. The threads are started on first use
+    in each process, after any fork.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.poll_interval = 5
+        self.lease_seconds = 300
+        self.retry_delay = 10
+        self.max_attempts = 5
+        self.worker_id = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._running = 0
+        self._executor = None
+
+    def configure(self, app):
+        self.app = app
+        self.workers = app.config['JOB_WORKERS']
+        self.poll_interval = app.config['JOB_POLL_INTERVAL']
+        self.lease_seconds = app.config['JOB_LEASE_SECONDS']
+        self.retry_delay = app.config['JOB_RETRY_DELAY']
+        self.max_attempts = app.config['JOB_MAX_ATTEMPTS']
+
+    def start(self):
+        """Start the pool and poller in this process, unless already running."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.worker_id = f'{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}'
+            self._running = 0
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            threading.Thread(target=self._poll, name='job-poller', daemon=True).start()
+
+    def stop(self):
+        """Stop claiming jobs and wait for the ones in progress to finish."""
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._pid = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                idle = self.workers - self._running
+            if idle <= 0:
+                continue
+            try:
+                with self.app.app_context():
+                    claimed = claim_jobs(self.worker_id, idle, self.lease_seconds)
+            except SQLAlchemyError:
+                logger.exception('Could not claim jobs')
+                continue
+            with self._lock:
+                self._running += len(claimed)
+            for job_id in claimed:
+                self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                run_job(job_id, self.worker_id, self.retry_delay)
+        except Exception:
+            logger.exception('Job %s could not be run', job_id)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._wake.set()
+
+
+job_runner = JobRunner()
+
+
+# Wake this process's runner as soon as a commit makes new jobs visible,
+# instead of waiting for the next poll
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_runner.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('jobs_enqueued', None)
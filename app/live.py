@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+from flask import Response
+from sqlalchemy import event, func
+from sqlalchemy.exc import SQLAlchemyError
+from app.jobs import enqueue, handler
+from app.models import db, LiveEvent, Product, DailySalesRollup
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('sales', 'stock')
+# Events a slow page may fall behind by before its stream is closed (it
+# reconnects and catches up from the table)
+QUEUE_SIZE = 100
+# Ids are handed out before commit, so a transaction that started earlier
+# can still commit a lower id; the tail keeps looking back this many seconds
+COMMIT_GRACE_SECONDS = 10
+# Most events a reconnecting page is sent to catch up
+REPLAY_LIMIT = 500
+# Seconds between jobs deleting events older than the retention period
+PRUNE_INTERVAL = 60
+
+
+def publish(channel, data):
+    """Queue an event for open pages in the current transaction. It is only
+    sent once the caller commits, and never if it rolls back. Does nothing
+    while live updates are off, so the table only grows when pages listen."""
+    if not live_broker.enabled():
+        return
+    db.session.add(LiveEvent(channel=channel, payload=json.dumps(data)))
+    db.session.info['live_published'] = True
+    live_broker.schedule_prune()
+
+
+def publish_stock(changes):
+    """Publish the new on-hand quantity and low-stock state of each product in
+    changes ({product_id: units added, negative for units removed}). Lots are
+    left out to keep checkout cheap; pages that show them fetch them after."""
+    rows = db.session.query(
+        Product.id, Product.name, Product.quantity_on_hand, Product.reorder_level
+    ).filter(Product.id.in_(sorted(changes)))
+    publish('stock', {'products': [{
+        'id': product_id,
+        'name': name,
+        'quantity_on_hand': quantity_on_hand,
+        'reorder_level': reorder_level,
+        'low': reorder_level is not None and quantity_on_hand <= reorder_level,
+        'change': changes[product_id]
+    } for product_id, name, quantity_on_hand, reorder_level in rows]})
+
+
+def publish_sale(sale):
+    """Publish a new sale, today's counters after it, and the stock it used."""
+    data = {
+        'sale_id': sale.id,
+        'customer': sale.customer.name if sale.customer else None,
+        'items': len(sale.items),
+        'total_amount': sale.total_amount,
+        'total_profit': sale.total_profit,
+        'created_at': sale.created_at.isoformat()
+    }
+    if sale.created_at.date() == date.today():
+        today = db.session.query(
+            DailySalesRollup.total_amount, DailySalesRollup.total_profit, DailySalesRollup.sale_count
+        ).filter(DailySalesRollup.sale_date == sale.created_at.date()).one()
+        data['today'] = {'total_amount': today[0], 'total_profit': today[1], 'sale_count': today[2]}
+    publish('sales', data)
+
+    changes = {}
+    for item in sale.items:
+        changes[item.product_id] = changes.get(item.product_id, 0) - item.quantity
+    publish_stock(changes)
+
+
+def format_event(event_id, channel, payload):
+    return f'id: {event_id}\nevent: {channel}\ndata: {payload}\n\n'
+
+
+class Subscription:
+    def __init__(self, channels):
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+
+class LiveBroker:
+    """Fans live events out to the Server-Sent Event streams of this process.
+
+    The live_event table is the broker: every process with open streams
+    runs one thread that tails it, every poll_interval seconds or as soon as
+    a local commit publishes, so events reach pages on every worker without
+    a separate pub/sub service. An open stream costs a request thread (a
+    greenlet on gevent workers) blocked on its queue and no database work; it sends a comment every heartbeat seconds
+    to notice closed connections, and ends after max_stream_seconds, when
+    the page reconnects and picks up where it left off (Last-Event-ID).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.poll_interval = 1.0
+        self.heartbeat = 15
+        self.max_stream_seconds = 300
+        self.max_connections = 100
+        self.updates = True
+        self.retention = 3600
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._cursor = None
+        self._seen = {}
+        self._pruned_at = None
+
+    def configure(self, app):
+        self.app = app
+        self.poll_interval = app.config['LIVE_POLL_INTERVAL']
+        self.heartbeat = app.config['LIVE_HEARTBEAT_SECONDS']
+        self.max_stream_seconds = app.config['LIVE_MAX_STREAM_SECONDS']
+        self.max_connections = app.config['LIVE_MAX_CONNECTIONS']
+        self.updates = app.config['LIVE_UPDATES']
+        self.retention = app.config['LIVE_EVENT_RETENTION']
+        # Pages only listen while live updates are on
+        app.add_template_global(self.enabled, 'live_enabled')
+
+    def enabled(self):
+        return self.updates
+
+    def wake(self):
+        self._wake.set()
+
+    def schedule_prune(self):
+        """Queue a job deleting expired events in the current transaction, at
+        most once per PRUNE_INTERVAL across all processes."""
+        if self._pruned_at is not None and time.monotonic() - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
+        enqueue('prune_live_events', dedupe_key=f'prune_live_events:{int(time.time() // PRUNE_INTERVAL)}')
+
+    def subscribe(self, channels):
+        """Register a stream for the given channels, or return None if this process is at max_connections."""
+        self._start()
+        with self._lock:
+            if len(self._subscriptions) >= self.max_connections:
+                return None
+            subscription = Subscription(set(channels))
+            self._subscriptions.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def replay(self, after_id, channels):
+        """Events after after_id still in the table, for a page reconnecting. Needs an app context."""
+        rows = db.session.query(LiveEvent.id, LiveEvent.channel, LiveEvent.payload).filter(
+            LiveEvent.id > after_id, LiveEvent.channel.in_(channels)
+        ).order_by(LiveEvent.id).limit(REPLAY_LIMIT).all()
+        return [(event_id, format_event(event_id, channel, payload)) for event_id, channel, payload in rows]
+
+    def stream(self, channels, last_event_id=None):
+        """A text/event-stream response for the given channels. Call from a
+        view; the database is only used before the response is returned."""
+        subscription = self.subscribe(channels)
+        if subscription is None:
+            # EventSource gives up for good on an error status, so a full
+            # process asks the page to try again in a minute instead
+            return Response('retry: 60000\n\n', mimetype='text/event-stream')
+        try:
+            replayed = self.replay(last_event_id, channels) if last_event_id is not None else []
+        except Exception:
+            self.unsubscribe(subscription)
+            raise
+
+        def generate():
+            try:
+                yield 'retry: 3000\n\n'
+                sent = set()
+                for event_id, message in replayed:
+                    sent.add(event_id)
+                    yield message
+                deadline = time.monotonic() + self.max_stream_seconds
+                while not subscription.overflowed and time.monotonic() < deadline:
+                    try:
+                        event_id, message = subscription.queue.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        yield ': keep-alive\n\n'
+                        continue
+                    if event_id not in sent:
+                        yield message
+            finally:
+                self.unsubscribe(subscription)
+
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _start(self):
+        # One tail thread per process, started after any fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscriptions = set()
+            self._cursor = None
+            threading.Thread(target=self._tail, name='live-tail', daemon=True).start()
+
+    def _tail(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                listening = bool(self._subscriptions)
+            if not listening:
+                # Nobody to tell; start from the newest event once somebody connects
+                self._cursor = None
+                continue
+            try:
+                with self.app.app_context():
+                    self._fetch()
+            except SQLAlchemyError:
+                logger.exception('Could not read live events')
+
+    def _fetch(self):
+        if self._cursor is None:
+            self._cursor = db.session.query(func.max(LiveEvent.id)).scalar() or 0
+            self._seen = {}
+            return
+
+        now = datetime.utcnow()
+        rows = db.session.query(LiveEvent.id, LiveEvent.channel, LiveEvent.payload, LiveEvent.created_at).filter(
+            LiveEvent.id > self._cursor
+        ).order_by(LiveEvent.id).all()
+        for event_id, channel, payload, created_at in rows:
+            if event_id not in self._seen:
+                self._seen[event_id] = created_at
+                self._dispatch(event_id, channel, format_event(event_id, channel, payload))
+
+        # Move the cursor past events old enough that no lower id can still commit
+        cutoff = now - timedelta(seconds=COMMIT_GRACE_SECONDS)
+        for event_id in sorted(self._seen):
+            if self._seen[event_id] >= cutoff:
+                break
+            self._cursor = event_id
+        self._seen = {event_id: created_at for event_id, created_at in self._seen.items() if event_id > self._cursor}
+
+    def _dispatch(self, event_id, channel, message):
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if channel in subscription.channels]
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait((event_id, message))
+            except queue.Full:
+                subscription.overflowed = True
+
+
+live_broker = LiveBroker()
+
+
+@handler('prune_live_events')
+def prune_live_events():
+    cutoff = datetime.utcnow() - timedelta(seconds=live_broker.retention)
+    LiveEvent.query.filter(LiveEvent.created_at < cutoff).delete(synchronize_session=False)
+
+
+# Tell this process's tail as soon as a commit publishes, instead of waiting
+# for the next poll
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('live_published', False):
+        live_broker.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('live_published', None)
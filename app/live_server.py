@@ -0,0 +1,24 @@
+"""Gunicorn settings for the live updates worker.
+
+One gevent process serves /api/live, where an open page costs a greenlet
+instead of a request thread. The image runs it under supervisord next to
+uWSGI, and nginx sends /api/live to it (see nginx.conf):
+
+    gunicorn -c /app/live_server.py
+"""
+import os
+
+# Read by app.config when the worker loads the app (this file is loaded by
+# path, before the app package is imported)
+os.environ.setdefault('LIVE_UPDATES', '1')
+os.environ.setdefault('LIVE_MAX_CONNECTIONS', '500')
+# Jobs are run by the uWSGI workers
+os.environ.setdefault('JOBS_IN_PROCESS', '0')
+
+wsgi_app = 'app.run:app'
+bind = os.environ.get('LIVE_BIND', '127.0.0.1:8001')
+workers = 1
+worker_class = 'gevent'
+# Room for pages reconnecting while the process is full; they are told to retry
+worker_connections = int(os.environ['LIVE_MAX_CONNECTIONS']) + 100
+graceful_timeout = 5
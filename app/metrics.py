@@ -0,0 +1,183 @@
+import re
+import threading
+import time
+from collections import deque
+from flask import g, has_request_context, request, Response, jsonify, abort
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# Quoted strings and bare numbers are replaced before a statement is kept as a
+# sample, so literal values never leave the process (bound parameters are
+# never recorded in the first place)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def redact(statement):
+    return _LITERAL_RE.sub('?', ' '.join(statement.split()))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+
+
+class MetricsRegistry:
+    """Per-process request and SQL statistics, keyed by Flask endpoint."""
+
+    def __init__(self, slow_query_samples=50):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_queries = deque(maxlen=slow_query_samples)
+
+    def record_request(self, endpoint, method, status, latency, query_count, db_seconds):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            key = (method, status)
+            stats.requests[key] = stats.requests.get(key, 0) + 1
+            stats.latency.observe(latency)
+            stats.queries.observe(query_count)
+            stats.db_seconds += db_seconds
+
+    def record_slow_query(self, endpoint, statement, seconds):
+        with self._lock:
+            self.slow_queries.append({
+                'endpoint': endpoint,
+                'statement': redact(statement),
+                'seconds': round(seconds, 6),
+                'at': time.time()
+            })
+
+    def render_prometheus(self):
+        lines = []
+
+        def histogram(name, help_text, attribute):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for endpoint, stats in sorted(self.endpoints.items()):
+                hist = getattr(stats, attribute)
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist.total}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {hist.sum}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {hist.total}')
+
+        with self._lock:
+            lines.append('# HELP myduka_http_requests_total Requests handled, by endpoint, method and status.')
+            lines.append('# TYPE myduka_http_requests_total counter')
+            for endpoint, stats in sorted(self.endpoints.items()):
+                for (method, status), count in sorted(stats.requests.items()):
+                    lines.append(f'myduka_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            histogram('myduka_http_request_duration_seconds', 'Request latency in seconds.', 'latency')
+            histogram('myduka_db_queries_per_request', 'SQL statements issued per request.', 'queries')
+
+            lines.append('# HELP myduka_db_query_seconds_total Time spent in SQL statements, by endpoint.')
+            lines.append('# TYPE myduka_db_query_seconds_total counter')
+            for endpoint, stats in sorted(self.endpoints.items()):
+                lines.append(f'myduka_db_query_seconds_total{{endpoint="{endpoint}"}} {stats.db_seconds}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if not has_request_context() or 'metrics_start' not in g:
+        return
+    elapsed = time.perf_counter() - started
+    g.metrics_queries += 1
+    g.metrics_db_seconds += elapsed
+    if elapsed >= g.metrics_slow_query_seconds:
+        g.metrics_registry.record_slow_query(request.endpoint or 'unknown', statement, elapsed)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def init_metrics(app):
+    """Hook request timing and SQL counting into the app and add /metrics."""
+    registry = MetricsRegistry(app.config['METRICS_SLOW_QUERY_SAMPLES'])
+    app.extensions['metrics'] = registry
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_registry = registry
+        g.metrics_slow_query_seconds = app.config['METRICS_SLOW_QUERY_SECONDS']
+        g.metrics_queries = 0
+        g.metrics_db_seconds = 0.0
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        latency = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or 'unknown'
+        registry.record_request(endpoint, request.method, response.status_code, latency,
+                                g.metrics_queries, g.metrics_db_seconds)
+
+        threshold = app.config['METRICS_QUERY_LOG_THRESHOLD']
+        if threshold and g.metrics_queries > threshold:
+            app.logger.warning('%s %s issued %d queries (%.1f ms in the database, %.1f ms total)',
+                               request.method, request.path, g.metrics_queries,
+                               g.metrics_db_seconds * 1000, latency * 1000)
+
+        if app.config['METRICS_DEBUG_HEADERS']:
+            response.headers['X-Query-Count'] = str(g.metrics_queries)
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.metrics_db_seconds * 1000:.1f}, app;dur={latency * 1000:.1f}'
+            )
+        return response
+
+    def authorize():
+        # Scrapers authenticate with a bearer token; otherwise require a login
+        token = app.config['METRICS_TOKEN']
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+        elif not current_user.is_authenticated:
+            abort(401)
+
+    @app.route('/metrics')
+    def metrics():
+        authorize()
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/slow-queries')
+    def metrics_slow_queries():
+        authorize()
+        return jsonify(list(registry.slow_queries))
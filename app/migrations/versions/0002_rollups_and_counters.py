@@ -0,0 +1,121 @@
+"""sales rollups, on-hand counters and lookup columns
+
+Adds the dashboard rollup tables, Product.quantity_on_hand,
+Sale.idempotency_key and the customer lookup indexes, and backfills the
+rollups and counters from existing sales and stock.
+
+These are the schema changes of the releases before migrations, which
+only ran db.create_all(): a database created by one of them already has
+some of this and is stamped 0001 like any other, so each step below is
+skipped when its table, column or index is already there.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 21:08:15.834840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def _has_column(table, column):
+    return column in {existing['name'] for existing in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _has_index(table, index):
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # The inspector leaves out expression indexes on SQLite
+        return bind.execute(sa.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND name = :index"
+        ), {'table': table, 'index': index}).first() is not None
+    return index in {existing['name'] for existing in sa.inspect(bind).get_indexes(table)}
+
+
+def upgrade():
+    new_daily_rollup = not _has_table('daily_sales_rollup')
+    if new_daily_rollup:
+        op.create_table('daily_sales_rollup',
+            sa.Column('sale_date', sa.Date(), nullable=False),
+            sa.Column('total_amount', sa.Float(), nullable=False),
+            sa.Column('total_profit', sa.Float(), nullable=False),
+            sa.Column('sale_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('sale_date')
+        )
+    new_product_rollup = not _has_table('product_sales_rollup')
+    if new_product_rollup:
+        op.create_table('product_sales_rollup',
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity_sold', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+            sa.PrimaryKeyConstraint('product_id')
+        )
+    if not _has_index('customer', 'ix_customer_phone'):
+        with op.batch_alter_table('customer', schema=None) as batch_op:
+            batch_op.create_index('ix_customer_phone', ['phone'], unique=False)
+    if not _has_index('customer', 'ix_customer_name_lower'):
+        op.create_index('ix_customer_name_lower', 'customer', [sa.text('lower(name)')], unique=False)
+    if not _has_index('customer', 'ix_customer_email_lower'):
+        op.create_index('ix_customer_email_lower', 'customer', [sa.text('lower(email)')], unique=False)
+
+    new_on_hand = not _has_column('product', 'quantity_on_hand')
+    if new_on_hand:
+        with op.batch_alter_table('product', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('quantity_on_hand', sa.Integer(), server_default='0', nullable=False))
+
+    # Releases before migrations made the key unique with a constraint; the
+    # index is added next to it so the schema matches the models
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        if not _has_column('sale', 'idempotency_key'):
+            batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        if not _has_index('sale', 'ix_sale_idempotency_key'):
+            batch_op.create_index('ix_sale_idempotency_key', ['idempotency_key'], unique=True)
+
+    # Backfill from the existing history; anything that was already there
+    # has been kept current by the release that added it
+    if new_on_hand:
+        op.execute(
+            'UPDATE product SET quantity_on_hand = '
+            '(SELECT COALESCE(SUM(stock.quantity), 0) FROM stock WHERE stock.product_id = product.id)'
+        )
+    if new_daily_rollup:
+        op.execute(
+            'INSERT INTO daily_sales_rollup (sale_date, total_amount, total_profit, sale_count) '
+            'SELECT DATE(created_at), SUM(total_amount), SUM(total_profit), COUNT(id) '
+            'FROM sale GROUP BY DATE(created_at)'
+        )
+    if new_product_rollup:
+        op.execute(
+            'INSERT INTO product_sales_rollup (product_id, quantity_sold, revenue) '
+            'SELECT product_id, SUM(quantity), SUM(quantity * unit_price) '
+            'FROM sale_item GROUP BY product_id'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_idempotency_key')
+        batch_op.drop_column('idempotency_key')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('quantity_on_hand')
+
+    op.drop_index('ix_customer_email_lower', table_name='customer')
+    op.drop_index('ix_customer_name_lower', table_name='customer')
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_phone')
+
+    op.drop_table('product_sales_rollup')
+    op.drop_table('daily_sales_rollup')
@@ -0,0 +1,45 @@
+"""indexes for hot queries
+
+Composite and covering indexes for the sales listing, customer history,
+FIFO stock depletion and per-product sales reports.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 21:09:02.177721
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.create_index('ix_sale_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_sale_customer_created_at', ['customer_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('sale_item', schema=None) as batch_op:
+        batch_op.create_index('ix_sale_item_product_totals', ['product_id', 'quantity', 'unit_price'], unique=False)
+        batch_op.create_index('ix_sale_item_sale_id', ['sale_id'], unique=False)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_product_restock', ['product_id', 'restock_date', 'id', 'quantity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_product_restock')
+
+    with op.batch_alter_table('sale_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_item_sale_id')
+        batch_op.drop_index('ix_sale_item_product_totals')
+
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_customer_created_at')
+        batch_op.drop_index('ix_sale_created_at_id')
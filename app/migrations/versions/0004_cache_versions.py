@@ -0,0 +1,28 @@
+"""cache version counters
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 22:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+        sa.Column('entity', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('entity')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
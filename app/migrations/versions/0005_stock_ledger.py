@@ -0,0 +1,81 @@
+"""stock ledger
+
+Adds the append-only stock_movement ledger, per-product stock snapshots and
+Stock.unit_cost. Existing lots hold what was left of them, so each becomes
+a receipt of that quantity at the product's current cost.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 21:18:30.736948
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('movement_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_snapshot_product_movement', ['product_id', 'movement_id'], unique=False)
+        batch_op.create_index('ix_stock_snapshot_product_taken', ['product_id', 'taken_at'], unique=False)
+
+    op.create_table('stock_movement',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('stock_id', sa.Integer(), nullable=True),
+        sa.Column('sale_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.ForeignKeyConstraint(['sale_id'], ['sale.id'], ),
+        sa.ForeignKeyConstraint(['stock_id'], ['stock.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_movement', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_movement_product_created', ['product_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_stock_movement_product_id', ['product_id', 'id', 'quantity'], unique=False)
+        batch_op.create_index('ix_stock_movement_stock_id', ['stock_id'], unique=False)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_cost', sa.Float(), nullable=True))
+
+    # Backfill: today's lots become the opening receipts of the ledger
+    op.execute('UPDATE stock SET unit_cost = (SELECT product.cost FROM product WHERE product.id = stock.product_id)')
+    op.execute(
+        "INSERT INTO stock_movement (product_id, kind, quantity, stock_id, created_at) "
+        "SELECT product_id, 'receipt', quantity, id, COALESCE(restock_date, CURRENT_TIMESTAMP) "
+        "FROM stock WHERE quantity > 0 ORDER BY restock_date, id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_column('unit_cost')
+
+    with op.batch_alter_table('stock_movement', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_movement_stock_id')
+        batch_op.drop_index('ix_stock_movement_product_id')
+        batch_op.drop_index('ix_stock_movement_product_created')
+
+    op.drop_table('stock_movement')
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_snapshot_product_taken')
+        batch_op.drop_index('ix_stock_snapshot_product_movement')
+
+    op.drop_table('stock_snapshot')
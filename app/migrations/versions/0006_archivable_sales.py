@@ -0,0 +1,44 @@
+"""archivable sales
+
+Drops the foreign key from stock_movement.sale_id to sale.id, so that closed
+months of sales can be moved out of the sale table into the archive while
+the stock ledger keeps pointing at them. On SQLite, sale and sale_item are
+rebuilt with AUTOINCREMENT so ids of archived rows are never handed out again.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 23:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# SQLite may keep the constraint unnamed; batch mode needs a name to find it
+naming_convention = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def upgrade():
+    bind = op.get_bind()
+    names = [fk['name'] for fk in sa.inspect(bind).get_foreign_keys('stock_movement') if fk['constrained_columns'] == ['sale_id']]
+    name = names[0] if names and names[0] else 'fk_stock_movement_sale_id_sale'
+    if bind.dialect.name == 'postgresql':
+        op.drop_constraint(name, 'stock_movement', type_='foreignkey')
+        return
+    with op.batch_alter_table('stock_movement', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(name, type_='foreignkey')
+
+    for table in ('sale', 'sale_item'):
+        with op.batch_alter_table(table, schema=None, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+
+def downgrade():
+    with op.batch_alter_table('stock_movement', schema=None) as batch_op:
+        batch_op.create_foreign_key('stock_movement_sale_id_fkey', 'sale', ['sale_id'], ['id'])
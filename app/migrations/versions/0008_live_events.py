@@ -0,0 +1,35 @@
+"""live events
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 21:55:41
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('live_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('channel', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('live_event', schema=None) as batch_op:
+        batch_op.create_index('ix_live_event_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('live_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_live_event_created_at')
+
+    op.drop_table('live_event')
@@ -0,0 +1,37 @@
+"""reorder levels and stock alerts
+
+Adds Product.reorder_level and the stock_alert table. Existing products
+have no reorder level, so there are no alerts to backfill.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 22:02:43
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_alert',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('raised_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reorder_level', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('reorder_level')
+
+    op.drop_table('stock_alert')
@@ -0,0 +1,59 @@
+"""open stock lots
+
+Adds Stock.remaining and a partial index over the lots that still hold
+units, and backfills remaining FIFO from the on-hand counters and lot
+write-offs (the same rule as app.inventory.fifo_lots).
+`flask check-stock --repair` recomputes it from the full ledger.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 22:14:22
+
+"""
+from itertools import groupby
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('remaining', sa.Integer(), server_default='0', nullable=False))
+
+    bind = op.get_bind()
+    on_hand = dict(bind.execute(sa.text('SELECT id, quantity_on_hand FROM product')).all())
+    write_offs = dict(bind.execute(sa.text(
+        "SELECT stock_id, SUM(quantity) FROM stock_movement "
+        "WHERE kind = 'adjustment' AND stock_id IS NOT NULL GROUP BY stock_id"
+    )).all())
+    lots = bind.execute(sa.text('SELECT id, product_id, quantity FROM stock ORDER BY product_id, restock_date, id')).all()
+
+    updates = []
+    for product_id, product_lots in groupby(lots, key=lambda lot: lot[1]):
+        sized = [(stock_id, quantity + (write_offs.get(stock_id) or 0)) for stock_id, _, quantity in product_lots]
+        consumed = max(sum(size for _, size in sized) - (on_hand.get(product_id) or 0), 0)
+        position = 0
+        for stock_id, size in sized:
+            remaining = min(size, max(position + size - consumed, 0))
+            position += size
+            if remaining > 0:
+                updates.append({'lot_id': stock_id, 'left': remaining})
+    if updates:
+        bind.execute(sa.text('UPDATE stock SET remaining = :left WHERE id = :lot_id'), updates)
+
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.alter_column('remaining', server_default=None)
+        batch_op.create_index('ix_stock_open', ['product_id', 'restock_date', 'id'], unique=False,
+                              sqlite_where=sa.text('remaining > 0'), postgresql_where=sa.text('remaining > 0'))
+
+
+def downgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_open')
+        batch_op.drop_column('remaining')
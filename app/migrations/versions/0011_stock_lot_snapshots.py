@@ -0,0 +1,42 @@
+"""stock lot snapshots
+
+Drops Stock.remaining and its open-lot index: lots are not written after
+receipt again, and what is left of them comes from the ledger. Snapshots
+record the first lot each product still had open instead, so FIFO reads
+skip the lots used up before it. Existing snapshots have none and read
+every lot of their product until the next snapshot.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 22:34:11
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_open')
+        batch_op.drop_column('remaining')
+
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('first_open_lot_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('stock_snapshot', schema=None) as batch_op:
+        batch_op.drop_column('first_open_lot_id')
+
+    # Lots come back empty; `flask check-stock --repair` at 0010 refills them
+    with op.batch_alter_table('stock', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('remaining', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_stock_open', ['product_id', 'restock_date', 'id'], unique=False,
+                              sqlite_where=sa.text('remaining > 0'), postgresql_where=sa.text('remaining > 0'))
@@ -0,0 +1,49 @@
+"""archived sale keys
+
+Adds the archived_sale_key table, which keeps the idempotency keys of sales
+moved to the archive so that offline tills replaying them get duplicates
+back, and backfills it from the months already in SALES_ARCHIVE_DIR.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 23:12:40
+
+"""
+import os
+import re
+import numpy as np
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    archived_sale_key = op.create_table('archived_sale_key',
+        sa.Column('idempotency_key', sa.String(length=64), nullable=False),
+        sa.Column('sale_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('idempotency_key')
+    )
+
+    directory = current_app.config.get('SALES_ARCHIVE_DIR')
+    if not directory or not os.path.isdir(directory):
+        return
+    keys = {}
+    for name in sorted(os.listdir(directory)):
+        if re.match(r'^sales-\d{4}-\d{2}\.npz$', name):
+            with np.load(os.path.join(directory, name)) as data:
+                keys.update((key, sale_id) for key, sale_id in zip(
+                    data['sale.idempotency_key'].tolist(), data['sale.id'].tolist()
+                ) if key)
+    if keys:
+        op.bulk_insert(archived_sale_key, [{'idempotency_key': key, 'sale_id': sale_id} for key, sale_id in keys.items()])
+
+
+def downgrade():
+    op.drop_table('archived_sale_key')
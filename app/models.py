@@ -1,10 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from app.passwords import password_hasher
+from app.replicas import RoutingSession
 
-# db will be initialized in __init__.py and imported here
-db = SQLAlchemy()
+# db will be initialized in __init__.py and imported here; its session can
+# send reads to a replica (see app.replicas)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,45 +16,76 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     cost = db.Column(db.Float, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    # Denormalized sum of Stock.quantity, kept current by the stock and sale routes
+    quantity_on_hand = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Alert when quantity_on_hand falls to this level or below; None means the product is not watched
+    reorder_level = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     stock = db.relationship('Stock', backref='product', lazy=True, cascade='all, delete-orphan')
     sale_items = db.relationship('SaleItem', backref='product', lazy=True)
+    sales_rollup = db.relationship('ProductSalesRollup', backref='product', lazy=True, uselist=False, cascade='all, delete-orphan')
+    movements = db.relationship('StockMovement', lazy=True, cascade='all, delete-orphan')
+    snapshots = db.relationship('StockSnapshot', lazy=True, cascade='all, delete-orphan')
+    alert = db.relationship('StockAlert', lazy=True, uselist=False, cascade='all, delete-orphan')
     
     def get_total_stock(self):
-        total = sum(item.quantity for item in self.stock)
-        return total
+        return self.quantity_on_hand or 0
     
     def get_profit_per_unit(self):
         return self.price - self.cost
+    
+    def is_low_stock(self):
+        return self.reorder_level is not None and self.get_total_stock() <= self.reorder_level
 
 class Stock(db.Model):
+    """A stock receipt (lot). Rows are never changed once written: sales and
+    write-offs are recorded in StockMovement, and what is left of each lot is
+    worked out FIFO from the ledger (see app.inventory.fifo_lots)."""
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    # Units received
     quantity = db.Column(db.Integer, nullable=False)
+    # Product cost at the time of the receipt, for FIFO valuation
+    unit_cost = db.Column(db.Float, nullable=True)
     restock_date = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # FIFO reads a product's lots oldest first; carrying quantity makes the
+    # index covering for that scan
+    __table_args__ = (
+        db.Index('ix_stock_product_restock', 'product_id', 'restock_date', 'id', 'quantity'),
+    )
+    
     def __repr__(self):
         return f'<Stock {self.id} - Product {self.product_id} - Qty: {self.quantity}>'
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    phone = db.Column(db.String(20), nullable=True)
+    phone = db.Column(db.String(20), nullable=True, index=True)
     email = db.Column(db.String(120), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Case-insensitive prefix search on name and email uses these expression indexes
+    __table_args__ = (
+        db.Index('ix_customer_name_lower', db.func.lower(name)),
+        db.Index('ix_customer_email_lower', db.func.lower(email)),
+    )
+    
     # Relationships
     sales = db.relationship('Sale', backref='customer', lazy=True)
 
@@ -61,10 +94,20 @@ class Sale(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
     total_amount = db.Column(db.Float, nullable=False)
     total_profit = db.Column(db.Float, nullable=False, default=0)
+    # Client-generated key so tills can safely replay queued sales
+    idempotency_key = db.Column(db.String(64), unique=True, index=True, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
+    
+    # Date-range listings page on (created_at, id); customer history filters first.
+    # AUTOINCREMENT stops SQLite from reusing the ids of archived sales
+    __table_args__ = (
+        db.Index('ix_sale_created_at_id', 'created_at', 'id'),
+        db.Index('ix_sale_customer_created_at', 'customer_id', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
 
 class SaleItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,6 +117,156 @@ class SaleItem(db.Model):
     unit_price = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
     
+    # Items are fetched per sale; per-product totals are served from a covering index
+    __table_args__ = (
+        db.Index('ix_sale_item_sale_id', 'sale_id'),
+        db.Index('ix_sale_item_product_totals', 'product_id', 'quantity', 'unit_price'),
+        {'sqlite_autoincrement': True},
+    )
+    
     def __repr__(self):
         return f'<SaleItem {self.id} - Sale {self.sale_id} - Product {self.product_id}>'
 
+class ArchivedSaleKey(db.Model):
+    """Idempotency key of a sale moved to the archive, so a till replaying
+    it is still told it is a duplicate."""
+    idempotency_key = db.Column(db.String(64), primary_key=True)
+    sale_id = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<ArchivedSaleKey {self.idempotency_key} - Sale {self.sale_id}>'
+
+
+class DailySalesRollup(db.Model):
+    """Per-day sales totals, maintained by add_sale so the dashboard never scans Sale."""
+    sale_date = db.Column(db.Date, primary_key=True)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    total_profit = db.Column(db.Float, nullable=False, default=0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailySalesRollup {self.sale_date} - Sales: {self.sale_count}>'
+
+class ProductSalesRollup(db.Model):
+    """All-time units sold and revenue per product, maintained by add_sale."""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ProductSalesRollup Product {self.product_id} - Sold: {self.quantity_sold}>'
+
+class CacheVersion(db.Model):
+    """Change counter per table, bumped in the same transaction as every write to it."""
+    entity = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CacheVersion {self.entity} - {self.version}>'
+
+class StockMovement(db.Model):
+    """Append-only inventory ledger: one row per receipt, sale line or adjustment.
+    
+    quantity is signed (receipts positive, sales and write-offs negative).
+    An adjustment that names a stock lot removes units from that lot; any
+    other negative movement consumes the oldest units first.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stock.id'), nullable=True)
+    # Not a foreign key: the sale may since have been moved to the archive
+    sale_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Movements are replayed per product after a snapshot (by id) or up to a date
+    __table_args__ = (
+        db.Index('ix_stock_movement_product_id', 'product_id', 'id', 'quantity'),
+        db.Index('ix_stock_movement_product_created', 'product_id', 'created_at'),
+        db.Index('ix_stock_movement_stock_id', 'stock_id'),
+    )
+    
+    RECEIPT = 'receipt'
+    SALE = 'sale'
+    ADJUSTMENT = 'adjustment'
+    
+    def __repr__(self):
+        return f'<StockMovement {self.id} - Product {self.product_id} - {self.kind} {self.quantity:+d}>'
+
+class StockSnapshot(db.Model):
+    """On-hand quantity of a product after all movements up to movement_id."""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    movement_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    # The product's lots with a lower id were used up by then; FIFO reads
+    # start here (None for snapshots taken before this was recorded)
+    first_open_lot_id = db.Column(db.Integer, nullable=True)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_product_movement', 'product_id', 'movement_id'),
+        db.Index('ix_stock_snapshot_product_taken', 'product_id', 'taken_at'),
+    )
+    
+    def __repr__(self):
+        return f'<StockSnapshot Product {self.product_id} - Qty: {self.quantity} @ {self.movement_id}>'
+
+class Job(db.Model):
+    """A unit of background work, written in the transaction that asks for it
+    and run by app.jobs. A worker claims a job by leasing it until
+    locked_until; if the worker dies the lease runs out and the job is
+    claimed again."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    # JSON-encoded keyword arguments for the handler
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Optional key so the same work is only ever queued once
+    dedupe_key = db.Column(db.String(100), unique=True, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    # Workers look for due jobs by status and time
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    def __repr__(self):
+        return f'<Job {self.id} - {self.name} ({self.status})>'
+
+class LiveEvent(db.Model):
+    """A change pushed to open pages by app.live. Written in the transaction
+    that made the change, so a page only hears about committed writes; every
+    worker process tails the table and fans new rows out to its own streams.
+    Rows are only kept for LIVE_EVENT_RETENTION seconds."""
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False)
+    # JSON-encoded event data
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<LiveEvent {self.id} - {self.channel}>'
+
+class StockAlert(db.Model):
+    """A product at or below its reorder level. Rows are added and removed by
+    app.alerts in the transaction that changes the product's quantity or
+    level, so the table is always exactly the set of low products."""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    raised_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StockAlert Product {self.product_id} since {self.raised_at}>'
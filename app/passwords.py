@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """Hashes and checks passwords with the configured Werkzeug method, e.g.
+    'scrypt:32768:8:1' (n, r, p) or 'pbkdf2:sha256:600000' (iterations).
+
+    Hashes made with any other method or cost still verify; needs_rehash
+    tells the caller to store a fresh hash once it has the plain password.
+    With workers > 0, verifying and hashing run on that many threads per
+    process (hashlib releases the GIL while hashing), so a burst of logins,
+    and the rehashes they trigger, cannot take over every request thread or
+    core at once.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt:32768:8:1'
+        self.workers = 0
+        self._prefix = None
+        self._pid = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_VERIFY_WORKERS']
+        self._prefix = None
+        # Hashing once here fails fast on a misspelt method
+        self.prefix
+
+    @property
+    def prefix(self):
+        # What Werkzeug writes before the salt, with its defaults filled in
+        # (e.g. 'scrypt' becomes 'scrypt:32768:8:1')
+        if self._prefix is None:
+            self._prefix = self.hash('').split('$', 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return self._call(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def _call(self, function, *args, **kwargs):
+        if not self.workers:
+            return function(*args, **kwargs)
+        return self._pool().submit(function, *args, **kwargs).result()
+
+    def _pool(self):
+        # Made on first use in each process, after any fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+                    self._pid = os.getpid()
+        return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,63 @@
+from datetime import datetime
+from sqlalchemy import and_, desc, func, select
+from app.models import db, Customer, Sale, SaleItem, Stock, StockMovement
+
+
+def hot_queries():
+    """The queries behind the busiest routes, each with the index it should use."""
+    since = datetime(2026, 1, 1)
+    return [
+        ('sales listing by date', 'ix_sale_created_at_id',
+         select(Sale.id, Sale.created_at).where(Sale.created_at >= since)
+         .order_by(desc(Sale.created_at), desc(Sale.id)).limit(25)),
+        ('customer sales history', 'ix_sale_customer_created_at',
+         select(Sale.id).where(Sale.customer_id == 1).order_by(desc(Sale.created_at)).limit(25)),
+        ('FIFO stock lots', 'ix_stock_product_restock',
+         select(Stock.id, Stock.quantity).where(Stock.product_id.in_([1, 2]))
+         .order_by(Stock.product_id, Stock.restock_date, Stock.id)),
+        ('stock ledger since snapshot', 'ix_stock_movement_product_id',
+         select(StockMovement.product_id, func.sum(StockMovement.quantity))
+         .where(StockMovement.product_id.in_([1, 2]), StockMovement.id > 100)
+         .group_by(StockMovement.product_id)),
+        ('items of a sale', 'ix_sale_item_sale_id',
+         select(SaleItem.id, SaleItem.quantity).where(SaleItem.sale_id == 1)),
+        ('per-product sales totals', 'ix_sale_item_product_totals',
+         select(SaleItem.product_id, func.sum(SaleItem.quantity), func.sum(SaleItem.quantity * SaleItem.unit_price))
+         .group_by(SaleItem.product_id)),
+        ('customer phone lookup', 'ix_customer_phone',
+         select(Customer.id).where(Customer.phone == '0700000000')),
+        ('customer name prefix', 'ix_customer_name_lower',
+         select(Customer.id).where(and_(func.lower(Customer.name) >= 'jo', func.lower(Customer.name) < 'jp'))),
+    ]
+
+
+def explain(statement):
+    """Return the database's query plan for a statement as text."""
+    connection = db.session.connection()
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positiontup:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params).all()
+        return '\n'.join(str(row[-1]) for row in rows)
+
+    # Postgres prefers sequential scans on small tables; forbid them for this
+    # transaction so the plan shows whether an index is usable at all
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = connection.exec_driver_sql('EXPLAIN ' + compiled.string, params).all()
+    return '\n'.join(row[0] for row in rows)
+
+
+def check_query_plans():
+    """EXPLAIN every hot query; returns (name, index, plan, uses_index) tuples."""
+    results = []
+    try:
+        for name, index, statement in hot_queries():
+            plan = explain(statement)
+            results.append((name, index, plan, index in plan))
+    finally:
+        db.session.rollback()
+    return results
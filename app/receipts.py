@@ -0,0 +1,210 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from reportlab.lib.pagesizes import A6
+from reportlab.lib.units import mm
+from flask import current_app
+from reportlab.pdfgen import canvas
+from app.jobs import handler
+from app.models import db, Customer, Product, Sale, SaleItem
+
+
+class ReceiptCache:
+    """Rendered receipt PDFs on disk, one file per sale id.
+
+    Reads refresh a file's modification time. The directory's size is
+    tracked in memory (counted once at startup, then by each write), and a
+    write that takes it past max_bytes evicts the least recently used files
+    down to EVICT_TO of it. Only then is the directory listed, which also
+    recounts files other processes wrote meanwhile.
+    """
+
+    # Fraction of max_bytes to evict down to, so a full cache is not listed
+    # again on every write
+    EVICT_TO = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._entries())
+
+    def path_for(self, sale_id):
+        return os.path.join(self.directory, f'receipt-{int(sale_id)}.pdf')
+
+    def get(self, sale_id):
+        path = self.path_for(sale_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, sale_id, pdf_bytes):
+        # Write to a temporary file first so readers never see a partial PDF
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(pdf_bytes)
+        path = self.path_for(sale_id)
+        with self._lock:
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            self._total += len(pdf_bytes) - replaced
+            if self._total > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self):
+        """(mtime, size, path) of every cached PDF."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        # Called with the lock held
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * self.EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total = total
+
+
+def load_receipt_data(sale_id):
+    """Fetch everything a receipt needs in one joined query, as plain data."""
+    rows = db.session.query(
+        Sale.id,
+        Sale.created_at,
+        Sale.total_amount,
+        Customer.name,
+        Product.name,
+        SaleItem.quantity,
+        SaleItem.unit_price,
+        SaleItem.total_price
+    ).outerjoin(Customer, Sale.customer_id == Customer.id).join(
+        SaleItem, SaleItem.sale_id == Sale.id
+    ).outerjoin(Product, SaleItem.product_id == Product.id).filter(
+        Sale.id == sale_id
+    ).order_by(SaleItem.id).all()
+
+    if not rows:
+        return None
+    first = rows[0]
+    return {
+        'id': first[0],
+        'created_at': first[1],
+        'total_amount': first[2],
+        'customer': first[3] or 'Walk-in Customer',
+        'items': [(row[4] or 'Deleted product', row[5], row[6], row[7]) for row in rows]
+    }
+
+
+def render_receipt_pdf(receipt):
+    """Draw a receipt on a narrow page sized to its number of lines."""
+    width = A6[0]
+    line = 5 * mm
+    height = 70 * mm + line * len(receipt['items'])
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(width, height))
+    pdf.setTitle(f'Receipt #{receipt["id"]}')
+
+    y = height - 12 * mm
+    pdf.setFont('Helvetica-Bold', 12)
+    pdf.drawCentredString(width / 2, y, 'MyDuka POS')
+    y -= line
+    pdf.setFont('Helvetica', 8)
+    pdf.drawCentredString(width / 2, y, f'Receipt #{receipt["id"]}')
+    y -= line
+    pdf.drawCentredString(width / 2, y, receipt['created_at'].strftime('%Y-%m-%d %H:%M:%S'))
+    y -= line * 1.5
+    pdf.drawString(8 * mm, y, f'Customer: {receipt["customer"]}')
+    y -= line
+    pdf.line(8 * mm, y, width - 8 * mm, y)
+    y -= line
+
+    pdf.setFont('Helvetica-Bold', 8)
+    pdf.drawString(8 * mm, y, 'Product')
+    pdf.drawRightString(width - 40 * mm, y, 'Qty')
+    pdf.drawRightString(width - 8 * mm, y, 'Total')
+    pdf.setFont('Helvetica', 8)
+    for name, quantity, unit_price, total_price in receipt['items']:
+        y -= line
+        pdf.drawString(8 * mm, y, name[:28])
+        pdf.drawRightString(width - 40 * mm, y, str(quantity))
+        pdf.drawRightString(width - 8 * mm, y, f'{total_price:,.2f}')
+
+    y -= line
+    pdf.line(8 * mm, y, width - 8 * mm, y)
+    y -= line
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawString(8 * mm, y, 'Total Amount')
+    pdf.drawRightString(width - 8 * mm, y, f'KES {receipt["total_amount"]:,.2f}')
+    y -= line * 2
+    pdf.setFont('Helvetica', 8)
+    pdf.drawCentredString(width / 2, y, 'Thank you for your business!')
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class ReceiptRenderer:
+    """Renders receipts on a bounded thread pool, one job per sale at a time."""
+
+    def __init__(self, app):
+        self.app = app
+        self.cache = ReceiptCache(app.config['RECEIPT_CACHE_DIR'], app.config['RECEIPT_CACHE_MAX_BYTES'])
+        self._executor = ThreadPoolExecutor(max_workers=app.config['RECEIPT_WORKERS'], thread_name_prefix='receipt')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, sale_id):
+        """Queue a receipt for rendering and return its future (shared if already queued)."""
+        with self._lock:
+            future = self._pending.get(sale_id)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._render, sale_id)
+            self._pending[sale_id] = future
+        # Outside the lock: a future that is already done runs the callback
+        # straight away, and _forget takes the lock itself
+        future.add_done_callback(lambda _: self._forget(sale_id))
+        return future
+
+    def _forget(self, sale_id):
+        with self._lock:
+            self._pending.pop(sale_id, None)
+
+    def _render(self, sale_id):
+        cached = self.cache.get(sale_id)
+        if cached:
+            return cached
+        with self.app.app_context():
+            receipt = load_receipt_data(sale_id)
+        if receipt is None:
+            return None
+        return self.cache.put(sale_id, render_receipt_pdf(receipt))
+
+
+@handler('render_receipt')
+def render_receipt_job(sale_id):
+    # Shares the render with anyone already waiting on the same receipt
+    current_app.extensions['receipts'].submit(sale_id).result()
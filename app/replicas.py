@@ -0,0 +1,188 @@
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica-'
+
+
+class RoutingSession(Session):
+    """Session that sends plain reads to a read replica when asked to.
+
+    A request opts in through read_replica, which puts the chosen replica's
+    bind key in session.info. Flushes, INSERT/UPDATE/DELETE statements and
+    SELECT ... FOR UPDATE always go to the primary, and after the first write
+    every later read in the session goes there too, so a request always sees
+    its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None:
+                replica = self.info.get('replica')
+                if replica is not None and not self.info.get('wrote'):
+                    return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _sqlite_path(engine):
+    return engine.url.database
+
+
+def _sqlite_mtime(path):
+    # Committed writes land in the -wal file first when WAL mode is on
+    mtimes = [os.path.getmtime(candidate) for candidate in (path, path + '-wal') if os.path.exists(candidate)]
+    return max(mtimes) if mtimes else 0
+
+
+def replica_lag(engine, primary):
+    """Seconds the replica behind engine is behind the primary, or None if unknown.
+
+    Postgres standbys report how long ago they replayed the last transaction,
+    counting as current once everything they received is replayed. SQLite
+    replicas are copies made by sync_sqlite_replicas; they count as behind
+    since their last copy once the primary has been written to after it.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            lag = connection.exec_driver_sql(
+                'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+            ).scalar()
+        return float(lag) if lag is not None else None
+    if engine.dialect.name == 'sqlite' and primary.dialect.name == 'sqlite':
+        # Only a copy writes the replica's main file; reads may still touch its -wal
+        path = _sqlite_path(engine)
+        if not os.path.exists(path):
+            return None
+        copied_at = os.path.getmtime(path)
+        return time.time() - copied_at if _sqlite_mtime(_sqlite_path(primary)) > copied_at else 0.0
+    return 0.0
+
+
+class ReplicaRouter:
+    """Picks a replica for read-only requests, skipping any that lag behind
+    the primary by more than max_lag seconds (checked at most every
+    check_interval seconds per replica). Returns None when there is no
+    usable replica, and the request reads from the primary."""
+
+    def __init__(self):
+        self.bind_keys = []
+        self.max_lag = 5.0
+        self.check_interval = 2.0
+        self.sticky_seconds = 10.0
+        self._lags = {}
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle([])
+
+    def configure(self, app):
+        self.bind_keys = sorted(key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith(REPLICA_BIND_PREFIX))
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.check_interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self._lags = {}
+        self._cycle = itertools.cycle(self.bind_keys)
+
+    def lag(self, key, engines):
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag = self._lags.get(key, (None, None))
+            if checked_at is not None and now - checked_at < self.check_interval:
+                return lag
+            # Other requests keep using the last reading while this one checks
+            self._lags[key] = (now, lag)
+        try:
+            lag = replica_lag(engines[key], engines[None])
+        except Exception:
+            logger.exception('Could not check replica %s', key)
+            lag = None
+        with self._lock:
+            self._lags[key] = (now, lag)
+        return lag
+
+    def choose(self, engines):
+        for _ in range(len(self.bind_keys)):
+            with self._lock:
+                key = next(self._cycle)
+            lag = self.lag(key, engines)
+            if lag is not None and lag <= self.max_lag:
+                return key
+        return None
+
+
+replica_router = ReplicaRouter()
+
+
+def read_replica(view):
+    """Serve a view's reads from a replica, within the configured staleness.
+
+    A client that wrote something in the last REPLICA_STICKY_SECONDS keeps
+    reading from the primary, so a cashier always sees the sale they just
+    rang up.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_router.bind_keys and session.get('_read_primary_until', 0) < time.time():
+            db = current_app.extensions['sqlalchemy']
+            key = replica_router.choose(db.engines)
+            if key is not None:
+                db.session.info['replica'] = key
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    if db_session.info.get('wrote') and has_request_context():
+        g.wrote_to_primary = True
+
+
+def init_replicas(app):
+    """Route reads for read_replica views, and pin clients that write to the primary for a while."""
+    replica_router.configure(app)
+
+    @app.after_request
+    def _pin_to_primary(response):
+        if replica_router.bind_keys and g.pop('wrote_to_primary', False):
+            session['_read_primary_until'] = time.time() + replica_router.sticky_seconds
+        return response
+
+
+def sync_sqlite_replicas():
+    """Copy a SQLite primary over each SQLite replica with the online backup
+    API, standing in for replication when trying replicas out locally.
+    Returns the paths written."""
+    db = current_app.extensions['sqlalchemy']
+    primary = db.engines[None]
+    if primary.dialect.name != 'sqlite':
+        raise RuntimeError('Only SQLite replicas can be synced here; use the database\'s own replication.')
+
+    paths = []
+    source = sqlite3.connect(_sqlite_path(primary))
+    try:
+        for key in replica_router.bind_keys:
+            engine = db.engines[key]
+            if engine.dialect.name != 'sqlite':
+                continue
+            engine.dispose()
+            target = sqlite3.connect(_sqlite_path(engine))
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            paths.append(_sqlite_path(engine))
+    finally:
+        source.close()
+    with replica_router._lock:
+        replica_router._lags.clear()
+    return paths
@@ -0,0 +1,101 @@
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Sale, SaleItem, DailySalesRollup, ProductSalesRollup
+
+
+def _increment(model, key, values):
+    """Add values onto the rollup row identified by key, creating it if missing.
+
+    Runs as an UPDATE first so concurrent tills only contend on a single row;
+    the INSERT path is wrapped in a savepoint in case another transaction
+    created the row in the meantime.
+    """
+    table = model.__table__
+    where = [table.c[name] == value for name, value in key.items()]
+    updates = {name: table.c[name] + value for name, value in values.items()}
+    result = db.session.execute(table.update().where(*where).values(**updates))
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**key, **values))
+    except IntegrityError:
+        db.session.execute(table.update().where(*where).values(**updates))
+
+
+def record_sale(sale, sale_items):
+    """Fold a flushed sale and its items into the rollup tables.
+
+    Must be called inside the same transaction as the sale so the rollups
+    commit (or roll back) together with it.
+    """
+    _increment(DailySalesRollup, {'sale_date': sale.created_at.date()}, {
+        'total_amount': sale.total_amount,
+        'total_profit': sale.total_profit,
+        'sale_count': 1
+    })
+
+    per_product = {}
+    for item in sale_items:
+        quantity, revenue = per_product.get(item.product_id, (0, 0))
+        per_product[item.product_id] = (quantity + item.quantity, revenue + item.quantity * item.unit_price)
+
+    for product_id, (quantity, revenue) in per_product.items():
+        _increment(ProductSalesRollup, {'product_id': product_id}, {
+            'quantity_sold': quantity,
+            'revenue': revenue
+        })
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from Sale, SaleItem and the sales archives (used for backfills)."""
+    from app.archive import archived_totals
+
+    DailySalesRollup.query.delete()
+    ProductSalesRollup.query.delete()
+
+    daily, per_product = archived_totals()
+
+    sale_date = func.date(Sale.created_at)
+    for day, amount, profit, count in db.session.query(
+        sale_date.label('sale_date'),
+        func.sum(Sale.total_amount),
+        func.sum(Sale.total_profit),
+        func.count(Sale.id)
+    ).group_by(sale_date):
+        totals = daily.setdefault(_as_date(day), [0, 0, 0])
+        totals[0] += amount or 0
+        totals[1] += profit or 0
+        totals[2] += count
+
+    for product_id, quantity, revenue in db.session.query(
+        SaleItem.product_id,
+        func.sum(SaleItem.quantity),
+        func.sum(SaleItem.quantity * SaleItem.unit_price)
+    ).group_by(SaleItem.product_id):
+        totals = per_product.setdefault(product_id, [0, 0])
+        totals[0] += quantity or 0
+        totals[1] += revenue or 0
+
+    db.session.add_all(DailySalesRollup(
+        sale_date=day,
+        total_amount=amount,
+        total_profit=profit,
+        sale_count=count
+    ) for day, (amount, profit, count) in daily.items())
+    db.session.add_all(ProductSalesRollup(
+        product_id=product_id,
+        quantity_sold=quantity,
+        revenue=revenue
+    ) for product_id, (quantity, revenue) in per_product.items())
+    db.session.commit()
+
+    return len(daily), len(per_product)
+
+
+def _as_date(value):
+    # SQLite's date() returns text rather than a date object
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
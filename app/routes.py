@@ -1,12 +1,54 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context, send_file, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
+import json
 from datetime import datetime
-from app.models import db, User, Product, Stock, Customer, Sale, SaleItem
-from sqlalchemy import func, desc
+from app.models import db, User, Product, Stock, StockMovement, Customer, Sale, SaleItem, DailySalesRollup, ProductSalesRollup
+from app.checkout import checkout, ingest_sales
+from app.importers import open_csv, import_products, import_stock
+from app.search import product_index
+from app.cache import ON_HAND, cached_view
+from app.jobs import enqueue
+from app.live import CHANNELS, live_broker, publish_sale, publish_stock
+from app.replicas import read_replica
+from app.archive import hot_since
+from app.analytics import reorder_report
+from app.exports import parse_date_range, sales_rows, sale_item_rows, stream_csv, stream_ndjson, SALE_COLUMNS, SALE_ITEM_COLUMNS
+from app.alerts import low_stock, parse_reorder_level, update_alerts
+from app.inventory import adjust_on_hand, inventory_totals, fifo_lots, record_movements, write_off_lot
+from sqlalchemy import func, desc, and_, or_
 
 def register_routes(app):
     
+    def csv_import(importer, endpoint):
+        # Shared by the product and stock CSV uploads; answers JSON clients
+        # with the full report and browsers with a flash summary
+        wants_json = request.accept_mimetypes.best == 'application/json'
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            if wants_json:
+                return jsonify({'success': False, 'message': 'No CSV file uploaded.'}), 400
+            flash('Please choose a CSV file to import.', 'danger')
+            return redirect(url_for(endpoint))
+        
+        try:
+            result = importer(open_csv(upload), batch_size=app.config['CSV_IMPORT_BATCH_SIZE'])
+        except Exception as e:
+            db.session.rollback()
+            if wants_json:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            flash(f'Error importing file: {str(e)}', 'danger')
+            return redirect(url_for(endpoint))
+        
+        if wants_json:
+            return jsonify({'success': result.error_count == 0, **result.to_dict()})
+        
+        flash(f'Imported {result.imported} row(s).', 'success' if result.imported else 'warning')
+        if result.error_count:
+            details = '; '.join(f'row {error["row"]}: {error["message"]}' for error in result.errors[:5])
+            flash(f'{result.error_count} row(s) skipped. {details}', 'danger')
+        return redirect(url_for(endpoint))
+    
     @app.route('/')
     def index():
         if current_user.is_authenticated:
@@ -68,6 +110,10 @@ def register_routes(app):
             user = User.query.filter_by(username=username).first()
             
             if user and user.check_password(password):
+                # Move the stored hash to the configured method and cost
+                if user.password_needs_rehash():
+                    user.set_password(password)
+                    db.session.commit()
                 login_user(user)
                 next_page = request.args.get('next')
                 return redirect(next_page) if next_page else redirect(url_for('dashboard'))
@@ -85,29 +131,25 @@ def register_routes(app):
     
     @app.route('/dashboard')
     @login_required
+    @read_replica
     def dashboard():
         from datetime import datetime, date, timedelta
         
+        # Totals come from the per-day rollup so this stays flat as Sale grows
+        totals = db.session.query(
+            func.sum(DailySalesRollup.total_amount),
+            func.sum(DailySalesRollup.total_profit)
+        ).one()
+        
         # Total Sales
-        total_sales = db.session.query(func.sum(Sale.total_amount)).scalar() or 0
+        total_sales = totals[0] or 0
         
         # Total Profit
-        total_profit = db.session.query(func.sum(Sale.total_profit)).scalar() or 0
-        
-        # Total Stock (sum of all stock quantities)
-        total_stock = db.session.query(func.sum(Stock.quantity)).scalar() or 0
-        
-        # Business Worth - Calculate inventory value
-        # Inventory value at cost (what we invested)
-        inventory_value_at_cost = 0
-        # Inventory value at selling price (potential revenue)
-        inventory_value_at_price = 0
+        total_profit = totals[1] or 0
         
-        products_with_inventory = Product.query.all()
-        for product in products_with_inventory:
-            stock_quantity = product.get_total_stock()
-            inventory_value_at_cost += product.cost * stock_quantity
-            inventory_value_at_price += product.price * stock_quantity
+        # Total Stock and inventory value from the on-hand counters in one query
+        # (at cost = what we invested, at price = potential revenue)
+        total_stock, inventory_value_at_cost, inventory_value_at_price = inventory_totals()
         
         # Total business worth = Inventory at cost + Total profit earned
         business_worth = inventory_value_at_cost + total_profit
@@ -118,29 +160,16 @@ def register_routes(app):
         today_start = datetime.combine(date.today(), datetime.min.time())
         today_end = datetime.combine(date.today(), datetime.max.time())
         
-        daily_sales_amount = db.session.query(func.sum(Sale.total_amount)).filter(
-            Sale.created_at >= today_start,
-            Sale.created_at <= today_end
-        ).scalar() or 0
-        
-        daily_profit = db.session.query(func.sum(Sale.total_profit)).filter(
-            Sale.created_at >= today_start,
-            Sale.created_at <= today_end
-        ).scalar() or 0
-        
-        daily_sales_count = Sale.query.filter(
-            Sale.created_at >= today_start,
-            Sale.created_at <= today_end
-        ).count()
+        today_rollup = db.session.get(DailySalesRollup, date.today())
+        daily_sales_amount = today_rollup.total_amount if today_rollup else 0
+        daily_profit = today_rollup.total_profit if today_rollup else 0
+        daily_sales_count = today_rollup.sale_count if today_rollup else 0
         
         # Sales for the last 7 days for chart
         seven_days_ago = today_start - timedelta(days=6)
-        daily_sales_data = db.session.query(
-            func.date(Sale.created_at).label('sale_date'),
-            func.sum(Sale.total_amount).label('daily_total')
-        ).filter(
-            Sale.created_at >= seven_days_ago
-        ).group_by(func.date(Sale.created_at)).order_by('sale_date').all()
+        daily_sales_data = DailySalesRollup.query.filter(
+            DailySalesRollup.sale_date >= seven_days_ago.date()
+        ).all()
         
         # Format for chart (fill missing days with 0)
         chart_labels = []
@@ -148,13 +177,12 @@ def register_routes(app):
         current_date = seven_days_ago.date()
         today_date = date.today()
         
-        # Create a dictionary from query results
-        sales_dict = {str(item.sale_date): float(item.daily_total or 0) for item in daily_sales_data}
+        # Create a dictionary from rollup rows
+        sales_dict = {item.sale_date: float(item.total_amount or 0) for item in daily_sales_data}
         
         while current_date <= today_date:
-            date_str = str(current_date)
             chart_labels.append(current_date.strftime('%b %d'))
-            chart_data.append(float(sales_dict.get(date_str, 0)))
+            chart_data.append(float(sales_dict.get(current_date, 0)))
             current_date += timedelta(days=1)
         
         # Today's sales list
@@ -167,14 +195,14 @@ def register_routes(app):
         top_products = db.session.query(
             Product.id,
             Product.name,
-            func.sum(SaleItem.quantity).label('total_sold')
-        ).join(SaleItem).group_by(Product.id, Product.name).order_by(desc('total_sold')).limit(5).all()
+            ProductSalesRollup.quantity_sold.label('total_sold')
+        ).join(ProductSalesRollup).order_by(desc(ProductSalesRollup.quantity_sold)).limit(5).all()
         
         # Sales per product for chart
         sales_per_product_query = db.session.query(
             Product.name,
-            func.sum(SaleItem.quantity * SaleItem.unit_price).label('total_revenue')
-        ).join(SaleItem).group_by(Product.id, Product.name).all()
+            ProductSalesRollup.revenue
+        ).join(ProductSalesRollup).all()
         
         # Convert to list of lists for JSON serialization
         sales_per_product = [[item[0], float(item[1] or 0)] for item in sales_per_product_query]
@@ -182,6 +210,9 @@ def register_routes(app):
         # Recent sales
         recent_sales = Sale.query.order_by(desc(Sale.created_at)).limit(5).all()
         
+        # Products at or below their reorder level, from the alert table
+        low_stock_alerts = low_stock()
+        
         return render_template('dashboard.html',
                              total_sales=total_sales,
                              total_profit=total_profit,
@@ -195,6 +226,7 @@ def register_routes(app):
                              top_products=top_products,
                              sales_per_product=sales_per_product,
                              recent_sales=recent_sales,
+                             low_stock_alerts=low_stock_alerts,
                              business_worth=business_worth,
                              inventory_value_at_cost=inventory_value_at_cost,
                              inventory_value_at_price=inventory_value_at_price,
@@ -203,6 +235,8 @@ def register_routes(app):
     # Product Routes
     @app.route('/products')
     @login_required
+    @read_replica
+    @cached_view('product', counters=(ON_HAND,))
     def products():
         products = Product.query.all()
         products_with_stock = []
@@ -221,6 +255,7 @@ def register_routes(app):
             name = request.form.get('name')
             cost = float(request.form.get('cost'))
             price = float(request.form.get('price'))
+            reorder_level = parse_reorder_level(request.form.get('reorder_level'))
             
             if not name or cost < 0 or price < 0:
                 flash('Invalid input. All fields required and values must be non-negative.', 'danger')
@@ -229,9 +264,12 @@ def register_routes(app):
             if price < cost:
                 flash('Price must be greater than or equal to cost.', 'warning')
             
-            product = Product(name=name, cost=cost, price=price)
+            product = Product(name=name, cost=cost, price=price, reorder_level=reorder_level)
             db.session.add(product)
+            db.session.flush()
+            update_alerts([product.id])
             db.session.commit()
+            product_index.add(product.id, product.name)
             
             flash('Product added successfully!', 'success')
         except Exception as e:
@@ -240,6 +278,13 @@ def register_routes(app):
         
         return redirect(url_for('products'))
     
+    @app.route('/products/import', methods=['POST'])
+    @login_required
+    def import_products_csv():
+        response = csv_import(import_products, 'products')
+        product_index.invalidate()
+        return response
+    
     @app.route('/products/edit/<int:id>', methods=['POST'])
     @login_required
     def edit_product(id):
@@ -248,12 +293,16 @@ def register_routes(app):
             product.name = request.form.get('name')
             product.cost = float(request.form.get('cost'))
             product.price = float(request.form.get('price'))
+            product.reorder_level = parse_reorder_level(request.form.get('reorder_level'))
             
             if product.cost < 0 or product.price < 0:
                 flash('Cost and price must be non-negative.', 'danger')
                 return redirect(url_for('products'))
             
+            db.session.flush()
+            update_alerts([product.id])
             db.session.commit()
+            product_index.add(product.id, product.name)
             flash('Product updated successfully!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -268,6 +317,7 @@ def register_routes(app):
             product = Product.query.get_or_404(id)
             db.session.delete(product)
             db.session.commit()
+            product_index.remove(id)
             flash('Product deleted successfully!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -278,8 +328,15 @@ def register_routes(app):
     # Stock Routes
     @app.route('/stock')
     @login_required
+    @read_replica
+    @cached_view('stock', 'product', ON_HAND)
     def stock():
-        stock_items = Stock.query.join(Product).order_by(Stock.restock_date.desc()).all()
+        # Lots that still hold units, newest first, with what is left of each
+        stock_items = sorted(
+            (entry for lots in fifo_lots().values() for entry in lots),
+            key=lambda entry: (entry[0].restock_date, entry[0].id),
+            reverse=True
+        )
         products = Product.query.all()
         products_with_stock = []
         for product in products:
@@ -303,8 +360,18 @@ def register_routes(app):
             
             product = Product.query.get_or_404(product_id)
             
-            stock_item = Stock(product_id=product_id, quantity=quantity)
+            stock_item = Stock(product_id=product_id, quantity=quantity, unit_cost=product.cost)
             db.session.add(stock_item)
+            adjust_on_hand(product_id, quantity)
+            db.session.flush()
+            record_movements([{
+                'product_id': product_id,
+                'kind': StockMovement.RECEIPT,
+                'quantity': quantity,
+                'stock_id': stock_item.id,
+                'created_at': stock_item.restock_date
+            }])
+            publish_stock({product_id: quantity})
             db.session.commit()
             
             flash('Stock added successfully!', 'success')
@@ -314,12 +381,20 @@ def register_routes(app):
         
         return redirect(url_for('stock'))
     
+    @app.route('/stock/import', methods=['POST'])
+    @login_required
+    def import_stock_csv():
+        return csv_import(import_stock, 'stock')
+    
     @app.route('/stock/delete/<int:id>', methods=['POST'])
     @login_required
     def delete_stock(id):
         try:
-            stock_item = Stock.query.get_or_404(id)
-            db.session.delete(stock_item)
+            # The lot stays on record; whatever is left of it is written off
+            written_off = write_off_lot(id)
+            if written_off is None:
+                abort(404)
+            publish_stock({db.session.get(Stock, id).product_id: -written_off})
             db.session.commit()
             flash('Stock entry deleted successfully!', 'success')
         except Exception as e:
@@ -331,9 +406,11 @@ def register_routes(app):
     # Customer Routes
     @app.route('/customers')
     @login_required
+    @read_replica
+    @cached_view()
     def customers():
-        customers = Customer.query.order_by(Customer.created_at.desc()).all()
-        return render_template('customers.html', customers=customers)
+        # Rows are fetched page by page from /api/customers
+        return render_template('customers.html')
     
     @app.route('/customers/add', methods=['POST'])
     @login_required
@@ -405,8 +482,95 @@ def register_routes(app):
     @app.route('/sales')
     @login_required
     def sales():
-        sales_list = Sale.query.order_by(desc(Sale.created_at)).all()
-        return render_template('sales.html', sales_list=sales_list)
+        # Rows are fetched page by page from /api/sales
+        return render_template('sales.html')
+    
+    @app.route('/api/sales')
+    @login_required
+    @read_replica
+    def api_sales():
+        try:
+            draw = request.args.get('draw', type=int, default=0)
+            start = max(request.args.get('start', type=int, default=0), 0)
+            length = min(max(request.args.get('length', type=int, default=25), 1), 500)
+            cursor = request.args.get('cursor')
+            date_from = request.args.get('date_from')
+            date_to = request.args.get('date_to')
+            customer_id = request.args.get('customer_id', type=int)
+            
+            start_date, end_date = parse_date_range(date_from, date_to)
+            filters = []
+            if start_date:
+                filters.append(Sale.created_at >= start_date)
+            if end_date:
+                filters.append(Sale.created_at < end_date)
+            if customer_id:
+                filters.append(Sale.customer_id == customer_id)
+            
+            # Keyset pagination: the cursor is the (created_at, id) of the last row seen
+            page_filters = list(filters)
+            if cursor:
+                cursor_time, cursor_id = cursor.rsplit('|', 1)
+                cursor_time = datetime.fromisoformat(cursor_time)
+                cursor_id = int(cursor_id)
+                page_filters.append(or_(
+                    Sale.created_at < cursor_time,
+                    and_(Sale.created_at == cursor_time, Sale.id < cursor_id)
+                ))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid filter or cursor.'}), 400
+        
+        item_count = db.session.query(func.count(SaleItem.id)).filter(
+            SaleItem.sale_id == Sale.id
+        ).correlate(Sale).scalar_subquery()
+        
+        query = db.session.query(
+            Sale.id,
+            Sale.total_amount,
+            Sale.total_profit,
+            Sale.created_at,
+            Customer.name,
+            item_count.label('item_count')
+        ).outerjoin(Customer, Sale.customer_id == Customer.id).filter(
+            *page_filters
+        ).order_by(desc(Sale.created_at), desc(Sale.id)).limit(length)
+        if not cursor:
+            query = query.offset(start)
+        rows = query.all()
+        
+        # The unfiltered total comes from the rollups instead of counting Sale,
+        # leaving out days that have been archived
+        records_total = db.session.query(func.sum(DailySalesRollup.sale_count))
+        archived_until = hot_since()
+        if archived_until:
+            records_total = records_total.filter(DailySalesRollup.sale_date >= archived_until)
+        records_total = records_total.scalar() or 0
+        if filters:
+            records_filtered = db.session.query(func.count(Sale.id)).filter(*filters).scalar()
+        else:
+            records_filtered = records_total
+        
+        data = [{
+            'id': row.id,
+            'customer': row.name or 'Walk-in',
+            'item_count': row.item_count,
+            'total_amount': row.total_amount,
+            'total_profit': row.total_profit,
+            'created_at': row.created_at.strftime('%Y-%m-%d %H:%M'),
+            'receipt_url': url_for('sale_receipt', id=row.id)
+        } for row in rows]
+        
+        next_cursor = None
+        if len(rows) == length:
+            next_cursor = f'{rows[-1].created_at.isoformat()}|{rows[-1].id}'
+        
+        return jsonify({
+            'draw': draw,
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': data,
+            'next_cursor': next_cursor
+        })
     
     @app.route('/sales/add', methods=['POST'])
     @login_required
@@ -416,71 +580,12 @@ def register_routes(app):
             customer_id = data.get('customer_id') if data.get('customer_id') else None
             items = data.get('items', [])
             
-            if not items:
-                return jsonify({'success': False, 'message': 'No items in sale.'}), 400
-            
-            # Validate stock and calculate totals
-            total_amount = 0
-            total_profit = 0
-            sale_items_data = []
-            
-            for item in items:
-                product_id = int(item['product_id'])
-                quantity = int(item['quantity'])
-                
-                if quantity <= 0:
-                    return jsonify({'success': False, 'message': f'Invalid quantity for product {product_id}.'}), 400
-                
-                product = Product.query.get_or_404(product_id)
-                available_stock = product.get_total_stock()
-                
-                if quantity > available_stock:
-                    return jsonify({'success': False, 'message': f'Insufficient stock for {product.name}. Available: {available_stock}'}), 400
-                
-                unit_price = product.price
-                total_price = unit_price * quantity
-                profit = (product.price - product.cost) * quantity
-                
-                total_amount += total_price
-                total_profit += profit
-                
-                sale_items_data.append({
-                    'product': product,
-                    'quantity': quantity,
-                    'unit_price': unit_price,
-                    'total_price': total_price
-                })
-            
-            # Create sale
-            sale = Sale(customer_id=customer_id, total_amount=total_amount, total_profit=total_profit)
-            db.session.add(sale)
-            db.session.flush()  # Get sale.id
-            
-            # Create sale items and update stock
-            for item_data in sale_items_data:
-                sale_item = SaleItem(
-                    sale_id=sale.id,
-                    product_id=item_data['product'].id,
-                    quantity=item_data['quantity'],
-                    unit_price=item_data['unit_price'],
-                    total_price=item_data['total_price']
-                )
-                db.session.add(sale_item)
-                
-                # Decrease stock (FIFO - First In First Out)
-                remaining = item_data['quantity']
-                stock_entries = Stock.query.filter_by(product_id=item_data['product'].id).order_by(Stock.restock_date.asc()).all()
-                
-                for stock_entry in stock_entries:
-                    if remaining <= 0:
-                        break
-                    if stock_entry.quantity <= remaining:
-                        remaining -= stock_entry.quantity
-                        db.session.delete(stock_entry)
-                    else:
-                        stock_entry.quantity -= remaining
-                        remaining = 0
-            
+            sale = checkout(customer_id, items, idempotency_key=data.get('idempotency_key'))
+            # Render the PDF receipt in the background once the sale is
+            # committed, so reprints are instant
+            enqueue('render_receipt', {'sale_id': sale.id})
+            # Open dashboards and stock pages hear about it once it commits
+            publish_sale(sale)
             db.session.commit()
             
             return jsonify({
@@ -492,14 +597,160 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'success': False, 'message': str(e)}), 400
     
+    @app.route('/sales/batch', methods=['POST'])
+    @login_required
+    def add_sales_batch():
+        # Offline tills replay their queue here as a JSON array or an NDJSON stream
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            def parse_lines():
+                for line in request.stream:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield line
+            sales_data = parse_lines()
+        else:
+            sales_data = request.get_json(silent=True)
+            if not isinstance(sales_data, list):
+                return jsonify({'success': False, 'message': 'Expected a JSON array of sales.'}), 400
+        
+        try:
+            results = ingest_sales(sales_data, commit_size=app.config['SALE_BATCH_COMMIT_SIZE'])
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        
+        return jsonify({
+            'success': counts['error'] == 0,
+            'created': counts['created'],
+            'duplicates': counts['duplicate'],
+            'failed': counts['error'],
+            'results': results
+        })
+    
     @app.route('/sales/<int:id>/receipt')
     @login_required
     def sale_receipt(id):
-        sale = Sale.query.get_or_404(id)
+        sale = Sale.query.options(
+            db.joinedload(Sale.customer),
+            db.selectinload(Sale.items).joinedload(SaleItem.product)
+        ).filter_by(id=id).first_or_404()
         return render_template('receipt.html', sale=sale)
     
+    @app.route('/sales/<int:id>/receipt.pdf')
+    @login_required
+    def sale_receipt_pdf(id):
+        renderer = app.extensions['receipts']
+        path = renderer.cache.get(id)
+        if path is None:
+            # Not rendered yet: join (or start) the background job for this sale
+            try:
+                path = renderer.submit(id).result(timeout=30)
+            except Exception as e:
+                return jsonify({'success': False, 'message': f'Could not render receipt: {str(e)}'}), 503
+        if path is None:
+            abort(404)
+        return send_file(path, mimetype='application/pdf', download_name=f'receipt-{id}.pdf', max_age=86400)
+    
+    # Reports
+    def build_reorder_report():
+        # ?days= overrides the configured history window, within reason
+        window_days = min(max(request.args.get('days', type=int, default=app.config['ANALYTICS_WINDOW_DAYS']), 7), 730)
+        return reorder_report(
+            window_days,
+            app.config['REORDER_LEAD_TIME_DAYS'],
+            app.config['REORDER_COVER_DAYS'],
+            app.config['REORDER_SAFETY_FACTOR']
+        )
+    
+    @app.route('/reports/inventory')
+    @login_required
+    @read_replica
+    def inventory_report():
+        return render_template('inventory_report.html', report=build_reorder_report())
+    
+    @app.route('/api/reports/inventory')
+    @login_required
+    @read_replica
+    def api_inventory_report():
+        report = build_reorder_report()
+        if request.args.get('reorder') in ('1', 'true'):
+            report['products'] = [row for row in report['products'] if row['reorder_quantity']]
+        abc_class = request.args.get('class', '').upper()
+        if abc_class:
+            report['products'] = [row for row in report['products'] if row['abc_class'] == abc_class]
+        return jsonify(report)
+    
+    @app.route('/api/stock/lots')
+    @login_required
+    @read_replica
+    def api_stock_lots():
+        # Open lots of ?product_ids=1,2 (FIFO order), for pages told of a stock change
+        try:
+            product_ids = [int(value) for value in request.args.get('product_ids', '').split(',') if value]
+        except ValueError:
+            return jsonify({'success': False, 'message': 'product_ids must be comma-separated ids.'}), 400
+        lots = fifo_lots(product_ids[:100]) if product_ids else {}
+        return jsonify({str(product_id): [{
+            'id': lot.id,
+            'quantity': lot.quantity,
+            'remaining': remaining,
+            'restock_date': lot.restock_date.isoformat()
+        } for lot, remaining in lots.get(product_id, [])] for product_id in product_ids[:100]})
+    
+    @app.route('/api/alerts/low-stock')
+    @login_required
+    @read_replica
+    def api_low_stock():
+        alerts = low_stock()
+        return jsonify({'count': len(alerts), 'alerts': alerts})
+    
+    @app.route('/export/<any(sales, "sale-items"):dataset>.<any(csv, ndjson):fmt>')
+    @login_required
+    @read_replica
+    def export_sales(dataset, fmt):
+        try:
+            start, end = parse_date_range(request.args.get('date_from'), request.args.get('date_to'))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Dates must be in YYYY-MM-DD format.'}), 400
+        
+        if dataset == 'sales':
+            columns, rows = SALE_COLUMNS, sales_rows
+        else:
+            columns, rows = SALE_ITEM_COLUMNS, sale_item_rows
+        
+        # Archived months are only read when asked for
+        include_archived = request.args.get('archived') in ('1', 'true')
+        
+        # The query runs lazily inside the generator, so bytes start flowing
+        # as soon as the first chunk of rows is fetched
+        def generate():
+            writer = stream_csv if fmt == 'csv' else stream_ndjson
+            yield from writer(columns, rows(start, end, include_archived))
+        
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        filename = f'{dataset}-{request.args.get("date_from") or "start"}-{request.args.get("date_to") or "now"}.{fmt}'
+        return Response(stream_with_context(generate()), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    @app.route('/api/live')
+    @login_required
+    def live_events():
+        # Server-Sent Events for ?channels=sales,stock (all of them by default)
+        requested = request.args.get('channels')
+        channels = [channel for channel in CHANNELS if not requested or channel in requested.split(',')]
+        return live_broker.stream(channels, request.headers.get('Last-Event-ID', type=int))
+    
     @app.route('/api/products')
     @login_required
+    @read_replica
+    @cached_view('product', counters=(ON_HAND,))
     def api_products():
         products = Product.query.all()
         products_data = []
@@ -513,10 +764,67 @@ def register_routes(app):
             })
         return jsonify(products_data)
     
+    @app.route('/api/products/search')
+    @login_required
+    @read_replica
+    def api_products_search():
+        query = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', type=int, default=10), 1), 50)
+        
+        product_ids = product_index.search(query, limit=limit)
+        if not product_ids:
+            return jsonify([])
+        
+        # Prices and stock are read fresh for just the matches
+        products_by_id = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids))}
+        products_data = []
+        for product_id in product_ids:
+            product = products_by_id.get(product_id)
+            if product is None:
+                continue
+            products_data.append({
+                'id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'cost': product.cost,
+                'stock': product.get_total_stock()
+            })
+        return jsonify(products_data)
+    
     @app.route('/api/customers')
     @login_required
+    @read_replica
     def api_customers():
-        customers = Customer.query.all()
+        # Cursor-paginated, newest first. Compatible with DataTables server-side
+        # processing (draw/start/length/search[value]) and with plain ?q= lookups.
+        draw = request.args.get('draw', type=int, default=0)
+        start = max(request.args.get('start', type=int, default=0), 0)
+        length = min(max(request.args.get('length', type=int, default=request.args.get('limit', type=int, default=25)), 1), 100)
+        cursor = request.args.get('cursor', type=int)
+        query_text = (request.args.get('q') or request.args.get('search[value]') or '').strip()
+        
+        filters = []
+        if query_text:
+            term = query_text.lower()
+            # Prefix match as a range on lower(...) so the expression indexes apply
+            upper_bound = term[:-1] + chr(ord(term[-1]) + 1)
+            if query_text.lstrip('+').replace(' ', '').isdigit():
+                # Phone numbers are an exact match
+                filters.append(Customer.phone == query_text)
+            elif '@' in term:
+                filters.append(and_(func.lower(Customer.email) >= term, func.lower(Customer.email) < upper_bound))
+            else:
+                filters.append(and_(func.lower(Customer.name) >= term, func.lower(Customer.name) < upper_bound))
+        
+        page_filters = list(filters)
+        if cursor:
+            page_filters.append(Customer.id < cursor)
+        
+        query = Customer.query.filter(*page_filters).order_by(desc(Customer.id)).limit(length)
+        if not cursor:
+            query = query.offset(start)
+        customers = query.all()
+        
         customers_data = []
         for customer in customers:
             customers_data.append({
@@ -525,5 +833,20 @@ def register_routes(app):
                 'phone': customer.phone,
                 'email': customer.email
             })
-        return jsonify(customers_data)
-
+        
+        # Counts are only needed by DataTables; till lookups skip them
+        records_total = records_filtered = None
+        if draw:
+            records_total = db.session.query(func.count(Customer.id)).scalar()
+            if filters:
+                records_filtered = db.session.query(func.count(Customer.id)).filter(*filters).scalar()
+            else:
+                records_filtered = records_total
+        
+        return jsonify({
+            'draw': draw,
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': customers_data,
+            'next_cursor': customers[-1].id if len(customers) == length else None
+        })
@@ -1,9 +1,16 @@
-from app import create_app, db
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+from app import create_app
+from app.models import db
 
 app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        # A database made by db.create_all() before migrations has no version
+        # table yet; every release before them has the initial schema
+        tables = inspect(db.engine).get_table_names()
+        if 'user' in tables and 'alembic_version' not in tables:
+            stamp(revision='0001')
+        upgrade()
     app.run(debug=True)
-
@@ -0,0 +1,106 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from app.models import db, Product
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class ProductIndex:
+    """In-memory prefix index over Product.name for the POS typeahead.
+
+    Tokens are kept in a sorted list of (token, product_id) pairs, so every
+    query token is resolved with a binary search over a prefix range. The
+    index only holds names; price and stock are read fresh for the matches.
+
+    Each worker process has its own copy. Routes update it in place when they
+    change a product, and it is rebuilt from the database when invalidated or
+    once it is older than max_age seconds, which picks up changes made by
+    other workers.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = []
+        self._names = {}
+        self._built_at = None
+
+    def build(self):
+        rows = db.session.query(Product.id, Product.name).all()
+        entries = sorted((token, product_id) for product_id, name in rows for token in set(tokenize(name)))
+        with self._lock:
+            self._entries = entries
+            self._names = {product_id: name for product_id, name in rows}
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def _ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def add(self, product_id, name):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove_locked(product_id)
+            self._names[product_id] = name
+            for token in set(tokenize(name)):
+                position = bisect_left(self._entries, (token, product_id))
+                self._entries.insert(position, (token, product_id))
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove_locked(product_id)
+
+    def _remove_locked(self, product_id):
+        name = self._names.pop(product_id, None)
+        for token in set(tokenize(name)):
+            position = bisect_left(self._entries, (token, product_id))
+            if position < len(self._entries) and self._entries[position] == (token, product_id):
+                del self._entries[position]
+
+    def _prefix_matches(self, prefix):
+        position = bisect_left(self._entries, (prefix,))
+        matches = set()
+        while position < len(self._entries) and self._entries[position][0].startswith(prefix):
+            matches.add(self._entries[position][1])
+            position += 1
+        return matches
+
+    def search(self, query, limit=10):
+        """Return up to limit product ids whose name has a word starting with every query token."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            # Resolve the most selective (longest) tokens first
+            candidates = None
+            for token in sorted(set(tokens), key=len, reverse=True):
+                matches = self._prefix_matches(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            names = {product_id: self._names[product_id].lower() for product_id in candidates}
+
+        phrase = ' '.join(tokens)
+        ranked = sorted(candidates, key=lambda product_id: (
+            not names[product_id].startswith(phrase),
+            len(names[product_id]),
+            names[product_id]
+        ))
+        return ranked[:limit]
+
+
+product_index = ProductIndex()
@@ -0,0 +1,34 @@
+// Live updates pushed by /api/live (see app/live.py).
+// MyDukaLive.listen(url, {sales: function (data) {...}, stock: ...}) calls a
+// handler with the parsed data of each event on its channel. EventSource
+// reconnects on its own, sending the last event id so nothing is missed.
+window.MyDukaLive = {
+    listen: function (url, handlers) {
+        if (!window.EventSource) {
+            return null;
+        }
+        const source = new EventSource(url);
+        Object.keys(handlers).forEach(function (channel) {
+            source.addEventListener(channel, function (event) {
+                handlers[channel](JSON.parse(event.data));
+            });
+        });
+        return source;
+    },
+
+    money: function (value) {
+        return 'KES ' + Number(value).toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    },
+
+    // Sets an element's data-value and redraws it with format
+    set: function (element, value, format) {
+        element.dataset.value = value;
+        element.textContent = format ? format(value) : Number(value).toLocaleString('en-US');
+    },
+
+    escape: function (text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+};
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+from app.models import db, User
+
+# Everything but the password hash, which stays in the database (the login
+# route reads it from there); a cached user has it unloaded, so reading it
+# raises instead of handing out a copy from the cache
+_COLUMNS = [column.key for column in User.__table__.columns if column.key != 'password_hash']
+
+
+def _dump(user):
+    return {key: getattr(user, key) for key in _COLUMNS}
+
+
+def _load(values):
+    # A detached User built from cached columns: usable as current_user
+    # without touching the database, and mergeable if a route needs to write
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+class LocalBackend:
+    """Process-local LRU of user column values with a time-to-live."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Shared cache for multi-worker deployments, so an invalidation in one
+    worker is seen by all of them. Needs the redis package."""
+
+    def __init__(self, url, ttl, prefix='myduka:user:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, user_id):
+        raw = self.client.get(f'{self.prefix}{user_id}')
+        if raw is None:
+            return None
+        values = json.loads(raw)
+        if values.get('created_at'):
+            values['created_at'] = datetime.fromisoformat(values['created_at'])
+        return values
+
+    def set(self, user_id, values):
+        payload = dict(values, created_at=values['created_at'].isoformat() if values.get('created_at') else None)
+        self.client.set(f'{self.prefix}{user_id}', json.dumps(payload), ex=max(1, int(self.ttl)))
+
+    def delete(self, user_id):
+        self.client.delete(f'{self.prefix}{user_id}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+class UserCache:
+    """Caches the user behind each session so login_manager.user_loader does
+    not query the database on every request.
+
+    Entries are dropped when a User row is updated or deleted (at flush and
+    again after commit). With the local backend other workers only notice a
+    change once their entry expires; configure USER_CACHE_URL to share one
+    cache between workers instead.
+    """
+
+    def __init__(self):
+        self.backend = LocalBackend(ttl=60, max_size=1024)
+
+    def configure(self, ttl, max_size, url=None):
+        if url:
+            self.backend = RedisBackend(url, ttl)
+        else:
+            self.backend = LocalBackend(ttl, max_size)
+
+    def load(self, user_id):
+        values = self.backend.get(user_id)
+        if values is not None:
+            return _load(values)
+        user = db.session.get(User, user_id)
+        if user is not None:
+            self.backend.set(user_id, _dump(user))
+        return user
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def clear(self):
+        self.backend.clear()
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate(target.id)
+    # Drop it again once the change is visible, in case a concurrent request
+    # re-cached the old row between this flush and the commit
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,89 @@
+"""Low-stock alerts benchmark.
+
+Gives every product of a generated catalogue a reorder level so that a
+small share of them is low, then compares reading the low-stock list from
+the alert table (app.alerts) with scanning the catalogue for it, and
+measures what keeping the alerts current adds to a checkout:
+
+    python -m benchmarks.alerts [--products 20000,100000] [--low 50]
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, Product  # noqa: E402
+from app.alerts import low_stock, rebuild_alerts, update_alerts  # noqa: E402
+from benchmarks.datagen import generate  # noqa: E402
+from benchmarks.routes import percentile  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to run against (defaults to a temporary SQLite file).')
+    parser.add_argument('--products', default='20000,100000', help='Comma-separated catalogue sizes.')
+    parser.add_argument('--low', type=int, default=50, help='Products left at or below their reorder level.')
+    parser.add_argument('--repeat', type=int, default=50, help='Timed repetitions of each read.')
+    return parser.parse_args()
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+        db.session.rollback()
+    return percentile(samples, 50) * 1000, percentile(samples, 95) * 1000
+
+
+def scan():
+    return db.session.query(Product.id, Product.name, Product.quantity_on_hand, Product.reorder_level).filter(
+        Product.reorder_level.isnot(None), Product.quantity_on_hand <= Product.reorder_level
+    ).order_by(Product.quantity_on_hand - Product.reorder_level, Product.name).all()
+
+
+def run(app, products, args):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(products=products, customers=10, sales=0, seed=42)
+        # Levels just under what is on hand, except for a few products that are at theirs
+        Product.query.update({Product.reorder_level: Product.quantity_on_hand - 1})
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+        low = random.Random(42).sample(product_ids, min(args.low, len(product_ids)))
+        Product.query.filter(Product.id.in_(low)).update(
+            {Product.reorder_level: Product.quantity_on_hand}, synchronize_session=False
+        )
+        db.session.commit()
+        rebuild_alerts()
+
+        assert len(low_stock()) == len(scan()) == len(low)
+        table = timed(low_stock, args.repeat)
+        scanned = timed(scan, args.repeat)
+        # The work a checkout of a 5-line cart adds to keep the alerts current
+        update = timed(lambda: update_alerts(random.sample(product_ids, 5)), args.repeat)
+        print(f'{products:>10}{len(low):>8}{table[0]:>12.2f}{table[1]:>10.2f}'
+              f'{scanned[0]:>12.2f}{scanned[1]:>10.2f}{update[0]:>14.2f}')
+
+
+def main():
+    args = parse_args()
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    Config.JOBS_IN_PROCESS = False
+    app = create_app()
+    print(f'{"products":>10}{"low":>8}{"table p50":>12}{"p95":>10}{"scan p50":>12}{"p95":>10}{"update p50":>14}  (ms)')
+    for products in (int(value) for value in args.products.split(',')):
+        run(app, products, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Inventory analytics benchmark.
+
+Generates a synthetic shop (see benchmarks.datagen) with recent sales in
+the database and older months in the sales archive, then times the
+reorder report (app.analytics) over both:
+
+    python -m benchmarks.analytics [--archived-lines 10000000] [--sales 50000]
+
+The archived line items are written straight to month files in the archive
+format rather than through the app, so ten million of them take well under
+a minute to set up. Reported are the time to bin the archived months, the
+time to aggregate the hot tables, and the whole report end to end.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, Product  # noqa: E402
+from app.archive import _write_month  # noqa: E402
+from app.analytics import daily_demand, reorder_report  # noqa: E402
+from benchmarks.datagen import generate  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to run against; defaults to a temporary SQLite file.')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=50000, help='Sales kept in the database.')
+    parser.add_argument('--days', type=int, default=60, help='Days of history in the database.')
+    parser.add_argument('--archived-lines', type=int, default=10_000_000, help='Line items in the archive.')
+    parser.add_argument('--archived-months', type=int, default=3, help='Months the archived lines are spread over.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs; the best is reported.')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def previous_month(month):
+    return date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+
+
+def write_archive(product_ids, prices, lines, months, before, rng):
+    """Spread lines over the full months before the date before, in the
+    archive's column format. Returns the first archived day."""
+    month = previous_month(date(before.year, before.month, 1))
+    per_month = np.full(months, lines // months)
+    per_month[:lines % months] += 1
+    for count in per_month.tolist():
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        sales = max(count // 3, 1)
+        seconds = int((datetime.combine(next_month, datetime.min.time()) - datetime.combine(month, datetime.min.time())).total_seconds())
+        created_at = np.datetime64(month, 'us') + np.sort(rng.integers(0, seconds * 10**6, sales)).astype('timedelta64[us]')
+        sale_ids = np.arange(1, sales + 1, dtype=np.int64) + month.toordinal() * 10**7
+        # Zipf-like popularity, as in the generator, at a fixed price per product
+        popularity = np.minimum(rng.zipf(1.3, count), len(product_ids)) - 1
+        quantity = rng.integers(1, 4, count)
+        unit_price = prices[popularity]
+        _write_month(month, {
+            'sale.id': sale_ids,
+            'sale.customer_id': np.zeros(sales, dtype=np.int64),
+            'sale.total_amount': np.zeros(sales),
+            'sale.total_profit': np.zeros(sales),
+            'sale.created_at': created_at,
+            'sale.idempotency_key': np.full(sales, ''),
+            'sale_item.id': np.arange(1, count + 1, dtype=np.int64),
+            # Items are kept in sale order, as archive_month writes them
+            'sale_item.sale_id': sale_ids[np.sort(rng.integers(0, sales, count))],
+            'sale_item.product_id': product_ids[popularity],
+            'sale_item.quantity': quantity,
+            'sale_item.unit_price': unit_price,
+            'sale_item.total_price': quantity * unit_price
+        })
+        first = month
+        month = previous_month(month)
+    return first
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    args = parse_args()
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    Config.SALES_ARCHIVE_DIR = tempfile.mkdtemp()
+    app = create_app()
+    rng = np.random.default_rng(args.seed)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        generate(products=args.products, customers=100, sales=args.sales, days=args.days, seed=args.seed)
+        print(f'generated {args.products} products, {args.sales} sales in {time.perf_counter() - started:.1f}s')
+
+        today = date.today()
+        hot_start = today - timedelta(days=args.days + 1)
+        products = db.session.query(Product.id, Product.price).order_by(Product.id).all()
+        product_ids = np.array([row[0] for row in products], dtype=np.int64)
+        prices = np.array([row[1] for row in products])
+        started = time.perf_counter()
+        archive_start = write_archive(product_ids, prices, args.archived_lines, args.archived_months, hot_start, rng)
+        print(f'archived {args.archived_lines:,} line items over {args.archived_months} month(s) '
+              f'in {time.perf_counter() - started:.1f}s')
+
+        archived_end = date(hot_start.year, hot_start.month, 1)
+        elapsed, (units, _) = best_of(args.repeat, lambda: daily_demand(product_ids, archive_start, archived_end))
+        print(f'\narchive  {elapsed:8.2f}s  {int(units.sum()):,} units binned '
+              f'({args.archived_lines / elapsed / 1e6:.1f}M lines/s)')
+
+        elapsed, (units, _) = best_of(args.repeat, lambda: daily_demand(product_ids, archived_end, today))
+        print(f'hot      {elapsed:8.2f}s  {int(units.sum()):,} units from the database')
+
+        window_days = (today - archive_start).days
+        elapsed, report = best_of(args.repeat, lambda: reorder_report(
+            window_days, app.config['REORDER_LEAD_TIME_DAYS'], app.config['REORDER_COVER_DAYS'],
+            app.config['REORDER_SAFETY_FACTOR']))
+        summary = report['summary']
+        print(f'report   {elapsed:8.2f}s  {window_days} days, {summary["products"]} products, '
+              f'{summary["to_reorder"]} to reorder, A/B/C = '
+              + '/'.join(str(summary['classes'][label]['products']) for label in 'ABC'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Checkout contention and throughput benchmark.
+
+Runs many tills against one SKU to show that the checkout engine never
+oversells, then times the legacy per-line checkout (which shrinks and deletes
+lots in place) against the ledger-based one.
+
+    python -m benchmarks.checkout [--database-url URL] [--threads 8]
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to run against (defaults to a temporary SQLite file).')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent tills in the contention run.')
+    parser.add_argument('--stock', type=int, default=200, help='Units of the contended SKU on hand.')
+    parser.add_argument('--lots', type=int, default=20, help='Stock lots the contended units are spread over.')
+    parser.add_argument('--sales', type=int, default=200, help='Sales per path in the throughput run.')
+    parser.add_argument('--lines', type=int, default=10, help='Cart lines per sale in the throughput run.')
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func  # noqa: E402
+from app import create_app  # noqa: E402
+from app.models import db, Product, Stock, StockMovement, Sale, SaleItem  # noqa: E402
+from app.checkout import checkout  # noqa: E402
+from app.inventory import adjust_on_hand, fifo_lots, record_movements  # noqa: E402
+from app.rollups import record_sale  # noqa: E402
+
+
+def legacy_checkout(customer_id, items):
+    """The add_sale loop as it was before the checkout engine (per-line queries, no locking)."""
+    total_amount = 0
+    total_profit = 0
+    sale_items_data = []
+    for item in items:
+        product = db.session.get(Product, int(item['product_id']))
+        quantity = int(item['quantity'])
+        available_stock = sum(lot.quantity for lot in product.stock)
+        if quantity > available_stock:
+            raise ValueError(f'Insufficient stock for {product.name}. Available: {available_stock}')
+        total_amount += product.price * quantity
+        total_profit += (product.price - product.cost) * quantity
+        sale_items_data.append((product, quantity))
+
+    sale = Sale(customer_id=customer_id, total_amount=total_amount, total_profit=total_profit)
+    db.session.add(sale)
+    db.session.flush()
+
+    sale_items = []
+    for product, quantity in sale_items_data:
+        sale_item = SaleItem(sale_id=sale.id, product_id=product.id, quantity=quantity,
+                             unit_price=product.price, total_price=product.price * quantity)
+        db.session.add(sale_item)
+        sale_items.append(sale_item)
+        remaining = quantity
+        for lot in Stock.query.filter_by(product_id=product.id).order_by(Stock.restock_date.asc()).all():
+            if remaining <= 0:
+                break
+            if lot.quantity <= remaining:
+                remaining -= lot.quantity
+                db.session.delete(lot)
+            else:
+                lot.quantity -= remaining
+                remaining = 0
+        adjust_on_hand(product.id, -quantity)
+
+    record_sale(sale, sale_items)
+    return sale
+
+
+def reset(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+
+def seed_product(name, units, lots, price=15.0, cost=10.0):
+    product = Product(name=name, cost=cost, price=price, quantity_on_hand=units)
+    db.session.add(product)
+    db.session.flush()
+    per_lot, extra = divmod(units, lots)
+    receipts = [Stock(product_id=product.id, quantity=per_lot + (1 if i < extra else 0), unit_cost=cost)
+                for i in range(lots)]
+    db.session.add_all(receipts)
+    db.session.flush()
+    record_movements([
+        {'product_id': product.id, 'kind': StockMovement.RECEIPT, 'quantity': lot.quantity, 'stock_id': lot.id}
+        for lot in receipts
+    ])
+    return product
+
+
+def lots_left_legacy(product_id):
+    # The legacy path shrinks and deletes lots in place
+    return db.session.query(func.coalesce(func.sum(Stock.quantity), 0)).filter_by(product_id=product_id).scalar()
+
+
+def lots_left_ledger(product_id):
+    return sum(remaining for _, remaining in fifo_lots([product_id]).get(product_id, []))
+
+
+def contention_run(app, sell, lots_left_of, label):
+    reset(app)
+    with app.app_context():
+        product_id = seed_product('Contended SKU', args.stock, args.lots).id
+        db.session.commit()
+
+    attempts_per_thread = args.stock // args.threads + 5
+    counters = {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def till():
+        for _ in range(attempts_per_thread):
+            with app.app_context():
+                try:
+                    sell(None, [{'product_id': product_id, 'quantity': 1}])
+                    db.session.commit()
+                    outcome = 'ok'
+                except Exception:
+                    db.session.rollback()
+                    outcome = 'rejected'
+            with lock:
+                counters[outcome] += 1
+
+    threads = [threading.Thread(target=till) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        sold = db.session.query(func.coalesce(func.sum(SaleItem.quantity), 0)).scalar()
+        lots_left = lots_left_of(product_id)
+        on_hand = db.session.get(Product, product_id).quantity_on_hand
+
+    oversold = max(sold + lots_left - args.stock, 0)
+    consistent = sold + lots_left == args.stock and on_hand == lots_left
+    print(f'{label:>8}: {counters["ok"]} sales, {counters["rejected"]} rejected, sold {sold}/{args.stock}, '
+          f'lots left {lots_left}, on hand {on_hand}, oversold {oversold}, '
+          f'{"consistent" if consistent else "INCONSISTENT"} ({elapsed:.2f}s)')
+    return consistent
+
+
+def throughput_run(app, sell, label):
+    reset(app)
+    with app.app_context():
+        product_ids = [seed_product(f'SKU {i}', args.sales * 2, 10).id for i in range(args.lines)]
+        db.session.commit()
+
+    cart = [{'product_id': product_id, 'quantity': 1} for product_id in product_ids]
+    started = time.perf_counter()
+    for _ in range(args.sales):
+        with app.app_context():
+            sell(None, cart)
+            db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f'{label:>8}: {args.sales} sales x {args.lines} lines in {elapsed:.2f}s '
+          f'({args.sales / elapsed:.1f} sales/s)')
+    return elapsed
+
+
+def main():
+    app = create_app()
+    print(f'Database: {app.config["SQLALCHEMY_DATABASE_URI"]}')
+
+    print(f'\nContention: {args.threads} tills selling {args.stock} units spread over {args.lots} lots')
+    contention_run(app, legacy_checkout, lots_left_legacy, 'legacy')
+    ok = contention_run(app, checkout, lots_left_ledger, 'ledger')
+
+    print(f'\nThroughput: sequential sales of {args.lines}-line carts')
+    legacy = throughput_run(app, legacy_checkout, 'legacy')
+    ledger = throughput_run(app, checkout, 'ledger')
+    print(f'Speed-up: {legacy / ledger:.2f}x')
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Mixed read/write concurrency benchmark.
+
+Generates a synthetic shop (see benchmarks.datagen), then runs several
+worker processes at once against it, the way uWSGI does, each mixing
+checkouts with customer and sales-list reads through the Flask test
+client. The run is repeated for each engine profile (app.engine_profiles)
+on a fresh copy of the data, reporting throughput, p95 latency and failed
+requests:
+
+    python -m benchmarks.concurrency [--processes 4] [--seconds 10] [--writes 0.2]
+
+SQLite compares SQLAlchemy's defaults (rollback journal) with the sqlite
+profile (WAL). A local Postgres is compared too, default pool against the
+postgres profile, when --postgres-url or BENCHMARK_POSTGRES_URL points at
+one that accepts connections; its tables are dropped and refilled.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, Product  # noqa: E402
+from benchmarks.datagen import generate, BENCH_PASSWORD  # noqa: E402
+from benchmarks.routes import percentile, postgres_available  # noqa: E402
+
+# Pages whose cost does not grow over a run (the dashboard lists every sale
+# rung up today, and the stock page re-renders the catalogue after each one)
+READS = ['/api/sales?draw=1&start={offset}&length=25', '/api/customers', '/customers']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCHMARK_POSTGRES_URL'),
+                        help='Local Postgres to run against as well, if reachable.')
+    parser.add_argument('--processes', type=int, default=4, help='Worker processes.')
+    parser.add_argument('--threads', type=int, default=1, help='Request threads per process.')
+    parser.add_argument('--seconds', type=float, default=10, help='Length of each timed run.')
+    parser.add_argument('--writes', type=float, default=0.2, help='Share of requests that are checkouts.')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--sales', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def prepare(url, profile, args):
+    """Fill the database and return the ids of products to sell."""
+    Config.SQLALCHEMY_DATABASE_URI = url
+    Config.DB_ENGINE_PROFILE = profile
+    # Keep each process to its request threads; receipts are not part of the mix
+    Config.JOBS_IN_PROCESS = False
+    Config.METRICS_QUERY_LOG_THRESHOLD = 0
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(products=args.products, customers=100, sales=args.sales, days=90, seed=args.seed)
+        # Plenty of stock, so no checkout is turned away for running out
+        Product.query.update({Product.quantity_on_hand: Product.quantity_on_hand + 10**6})
+        db.session.commit()
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+        db.session.remove()
+        db.engine.dispose()
+    return product_ids
+
+
+def client_loop(app, product_ids, args, deadline, seed, results):
+    rng = random.Random(seed)
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': BENCH_PASSWORD})
+    while time.perf_counter() < deadline:
+        write = rng.random() < args.writes
+        started = time.perf_counter()
+        try:
+            if write:
+                cart = [{'product_id': product_id, 'quantity': 1} for product_id in rng.sample(product_ids, 3)]
+                response = client.post('/sales/add', json={'customer_id': None, 'items': cart})
+            else:
+                response = client.get(rng.choice(READS).format(offset=rng.randrange(0, 1000, 25)))
+            response.get_data()
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        results.append((write, time.perf_counter() - started, failed))
+
+
+def worker(product_ids, args, start_at, index, queue):
+    app = create_app()
+    results = []
+    # Start together, after every process has finished importing and setting up
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=client_loop, args=(app, product_ids, args, deadline, args.seed * 1000 + index * 10 + n, results))
+        for n in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.put(results)
+
+
+def run(url, profile, args):
+    product_ids = prepare(url, profile, args)
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    start_at = time.time() + 2
+    processes = [context.Process(target=worker, args=(product_ids, args, start_at, index, queue))
+                 for index in range(args.processes)]
+    for process in processes:
+        process.start()
+    results = [row for _ in processes for row in queue.get()]
+    for process in processes:
+        process.join()
+
+    summary = {}
+    for label, write in (('reads', False), ('writes', True)):
+        rows = [row for row in results if row[0] == write]
+        latencies = [row[1] for row in rows if not row[2]] or [0]
+        summary[label] = {
+            'per_second': sum(1 for row in rows if not row[2]) / args.seconds,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'failed': sum(1 for row in rows if row[2])
+        }
+    return summary
+
+
+def report(label, profile, summary):
+    line = f'  {label:<12}{profile:<10}'
+    for kind in ('reads', 'writes'):
+        row = summary[kind]
+        line += f'{row["per_second"]:>9.1f}/s{row["p95_ms"]:>9.1f}ms{row["failed"]:>7}'
+    print(line)
+
+
+def main():
+    args = parse_args()
+    targets = [('sqlite', lambda: 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'), ['none', 'sqlite'])]
+    if args.postgres_url and postgres_available(args.postgres_url):
+        targets.append(('postgresql', lambda: args.postgres_url, ['none', 'postgres']))
+
+    print(f'{args.processes} process(es) x {args.threads} thread(s), {args.seconds:g}s per run, '
+          f'{args.writes:.0%} checkouts')
+    print(f'  {"database":<12}{"profile":<10}{"reads":>11}{"p95":>11}{"failed":>7}{"writes":>11}{"p95":>11}{"failed":>7}')
+    for label, url, profiles in targets:
+        for profile in profiles:
+            # A fresh SQLite file each time: journal_mode=WAL sticks to the file
+            report(label, profile, run(url(), profile, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Synthetic data generator for benchmarks.
+
+Fills users, products, customers, sales and sale items at a chosen scale,
+with the stock ledger the app would have written: a sale movement per sale
+line, and per product a restock history of lots covering what it sold plus
+what is still on hand. FIFO then leaves only the newest lots (the oldest of
+them partly sold). On-hand counters, ledger snapshots and rollups are filled
+in so the data matches what the app itself would write.
+
+    python -m benchmarks.datagen --database-url URL --products 10000 --sales 1000000 [--reset]
+
+All users share the password "bench"; the first one is called "bench".
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+from app.models import db, User, Product, Stock, StockMovement, Customer, Sale, SaleItem  # noqa: E402
+from app.inventory import take_snapshots  # noqa: E402
+from app.rollups import rebuild_rollups  # noqa: E402
+
+BENCH_PASSWORD = 'bench'
+INSERT_CHUNK_SIZE = 10000
+
+BRANDS = ['Kabras', 'Mumias', 'Brookside', 'Kensalt', 'Elianto', 'Omo', 'Geisha', 'Ketepa',
+          'Exe', 'Soko', 'Pembe', 'Jogoo', 'Daawat', 'Fresh Fri', 'Menengai', 'Dettol']
+ITEMS = ['Sugar', 'Milk', 'Salt', 'Cooking Oil', 'Detergent', 'Soap', 'Tea Leaves', 'Maize Flour',
+         'Wheat Flour', 'Rice', 'Bread', 'Margarine', 'Toothpaste', 'Matches', 'Candles', 'Biscuits']
+SIZES = ['250g', '500g', '1kg', '2kg', '5kg', '500ml', '1L', '2L', '3L', 'Pack of 6', 'Single']
+FIRST_NAMES = ['Jane', 'John', 'Mary', 'Peter', 'Grace', 'James', 'Faith', 'David', 'Mercy', 'Brian',
+               'Esther', 'Kevin', 'Ann', 'Dennis', 'Lucy', 'Samuel']
+LAST_NAMES = ['Wanjiku', 'Otieno', 'Kamau', 'Achieng', 'Mwangi', 'Njeri', 'Kiprop', 'Atieno',
+              'Mutua', 'Chebet', 'Omondi', 'Wambui', 'Kariuki', 'Nyambura', 'Ouma', 'Kilonzo']
+
+
+def _insert_chunks(model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            db.session.execute(model.__table__.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(model.__table__.insert(), chunk)
+
+
+def _insert_lots(rows):
+    if rows:
+        db.session.execute(Stock.__table__.insert(), rows)
+        db.session.execute(StockMovement.__table__.insert(), [
+            {'product_id': row['product_id'], 'kind': StockMovement.RECEIPT, 'quantity': row['quantity'],
+             'stock_id': row['id'], 'created_at': row['restock_date']}
+            for row in rows
+        ])
+        rows.clear()
+
+
+def generate(users=5, products=1000, customers=1000, sales=10000, days=365, max_lines=5, seed=42, log=None):
+    """Fill an empty schema with synthetic data. Must run inside an app context."""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    _insert_chunks(User, (
+        {'id': i, 'username': 'bench' if i == 1 else f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': password_hash, 'created_at': start}
+        for i in range(1, users + 1)
+    ))
+
+    catalogue = []
+    for product_id in range(1, products + 1):
+        cost = round(rng.uniform(10, 500), 2)
+        price = round(cost * rng.uniform(1.1, 1.6), 2)
+        name = f'{rng.choice(BRANDS)} {rng.choice(ITEMS)} {rng.choice(SIZES)} #{product_id}'
+        remaining = rng.choice([0, rng.randint(1, 10), rng.randint(10, 200), rng.randint(10, 200)])
+        catalogue.append({'id': product_id, 'name': name, 'cost': cost, 'price': price,
+                          'quantity_on_hand': remaining, 'created_at': start})
+    _insert_chunks(Product, catalogue)
+    log(f'{products} products')
+
+    _insert_chunks(Customer, (
+        {'id': i, 'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+         'phone': f'07{rng.randrange(10 ** 8):08d}', 'email': f'customer{i}@example.com', 'created_at': start}
+        for i in range(1, customers + 1)
+    ))
+    log(f'{customers} customers')
+
+    # A few products sell most of the volume (Zipf-like popularity)
+    popularity = list(range(1, products + 1))
+    rng.shuffle(popularity)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, products + 1):
+        total += 1 / rank ** 1.1
+        cum_weights.append(total)
+
+    sold = [0] * (products + 1)
+    span = (now - start).total_seconds()
+    offsets = sorted(rng.random() * span for _ in range(sales))
+    sale_rows = []
+    item_rows = []
+    movement_rows = []
+    item_id = 0
+    for sale_id, offset in enumerate(offsets, start=1):
+        lines = {}
+        for product_id in rng.choices(popularity, cum_weights=cum_weights, k=rng.randint(1, max_lines)):
+            lines[product_id] = lines.get(product_id, 0) + rng.randint(1, 3)
+        amount = 0.0
+        profit = 0.0
+        for product_id, quantity in lines.items():
+            product = catalogue[product_id - 1]
+            item_id += 1
+            item_rows.append({'id': item_id, 'sale_id': sale_id, 'product_id': product_id, 'quantity': quantity,
+                              'unit_price': product['price'], 'total_price': product['price'] * quantity})
+            amount += product['price'] * quantity
+            profit += (product['price'] - product['cost']) * quantity
+            sold[product_id] += quantity
+        created_at = start + timedelta(seconds=offset)
+        for product_id, quantity in lines.items():
+            movement_rows.append({'product_id': product_id, 'kind': StockMovement.SALE, 'quantity': -quantity,
+                                  'sale_id': sale_id, 'created_at': created_at})
+        # Roughly four in ten sales are to walk-in customers
+        customer_id = rng.randint(1, customers) if customers and rng.random() < 0.6 else None
+        sale_rows.append({'id': sale_id, 'customer_id': customer_id, 'total_amount': amount, 'total_profit': profit,
+                          'created_at': created_at})
+        if len(item_rows) >= INSERT_CHUNK_SIZE:
+            db.session.execute(Sale.__table__.insert(), sale_rows)
+            db.session.execute(SaleItem.__table__.insert(), item_rows)
+            db.session.execute(StockMovement.__table__.insert(), movement_rows)
+            db.session.commit()
+            sale_rows = []
+            item_rows = []
+            movement_rows = []
+            log(f'{sale_id} sales')
+    if sale_rows:
+        db.session.execute(Sale.__table__.insert(), sale_rows)
+    if item_rows:
+        db.session.execute(SaleItem.__table__.insert(), item_rows)
+        db.session.execute(StockMovement.__table__.insert(), movement_rows)
+    log(f'{sales} sales, {item_id} sale items')
+
+    # Restock history per product, received in lots spread over the period,
+    # adding up to what was sold plus what is on hand
+    lot_rows = []
+    stock_id = 0
+    for product in catalogue:
+        received = sold[product['id']] + product['quantity_on_hand']
+        lot_size = rng.randint(20, 200)
+        lots = -(-received // lot_size)
+        step = span / max(lots, 1)
+        for index in range(lots):
+            stock_id += 1
+            lot_rows.append({'id': stock_id, 'product_id': product['id'],
+                             'quantity': received - lot_size * (lots - 1) if index == 0 else lot_size,
+                             'unit_cost': product['cost'], 'restock_date': start + timedelta(seconds=step * index)})
+        if len(lot_rows) >= INSERT_CHUNK_SIZE:
+            _insert_lots(lot_rows)
+    _insert_lots(lot_rows)
+    db.session.commit()
+    log(f'{stock_id} stock lots')
+
+    log(f'{take_snapshots()} stock snapshots')
+
+    # Ids were assigned here, so move Postgres sequences past them
+    if db.engine.dialect.name == 'postgresql':
+        for model in (User, Product, Customer, Sale, SaleItem, Stock):
+            table = model.__tablename__
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))"
+            ))
+        db.session.commit()
+
+    days_rolled, products_rolled = rebuild_rollups()
+    log(f'rollups for {days_rolled} day(s) and {products_rolled} product(s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='Database to fill.')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first.')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--sales', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365, help='Days of sales history.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app.config import Config
+    from app import create_app
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Sale.id).first() or db.session.query(Product.id).first():
+            parser.error('the database already has data; pass --reset to replace it')
+        generate(args.users, args.products, args.customers, args.sales, args.days, seed=args.seed, log=print)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Live updates benchmark.
+
+Starts the live updates worker the image ships (gunicorn with gevent, see
+app/live_server.py), opens many idle Server-Sent Event streams to it over
+HTTP, measures the CPU and memory the worker uses while nothing happens,
+then rings up sales from this process and measures how long each event
+takes to reach every stream:
+
+    python -m benchmarks.live [--streams 500] [--sales 50]
+
+Needs gevent and gunicorn. Without --database-url a throwaway SQLite file
+is used.
+"""
+import argparse
+import json
+import os
+import random
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, Product  # noqa: E402
+from benchmarks.datagen import generate, BENCH_PASSWORD  # noqa: E402
+from benchmarks.routes import percentile  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to run against (defaults to a temporary SQLite file).')
+    parser.add_argument('--port', type=int, default=8001, help='Port for the live updates worker.')
+    parser.add_argument('--streams', type=int, default=500, help='Open streams.')
+    parser.add_argument('--idle', type=float, default=10, help='Seconds to measure idle CPU over.')
+    parser.add_argument('--sales', type=int, default=50, help='Sales rung up while the streams listen.')
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between sales.')
+    parser.add_argument('--settle', type=float, default=5, help='Seconds to wait for the last events after the sales.')
+    return parser.parse_args()
+
+
+def cpu_seconds(pid):
+    # utime and stime of a process, from /proc
+    fields = open(f'/proc/{pid}/stat').read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def rss_mib(pid):
+    for line in open(f'/proc/{pid}/status'):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) / 1024
+    return 0
+
+
+def start_worker(args, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=Config.SECRET_KEY,
+               LIVE_MAX_CONNECTIONS=str(args.streams), LIVE_BIND=f'127.0.0.1:{args.port}')
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'app', 'live_server.py')],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', args.port), timeout=1).close()
+            children = open(f'/proc/{master.pid}/task/{master.pid}/children').read().split()
+            if children:
+                return master, int(children[0])
+        except OSError:
+            pass
+        time.sleep(0.2)
+    master.kill()
+    raise SystemExit('The live updates worker did not start.')
+
+
+class Listener:
+    """Reads every stream on one thread and records when each sale's event arrives."""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def open(self, port, cookie, count):
+        request = (f'GET /api/live?channels=sales HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                   f'Cookie: session={cookie}\r\nAccept: text/event-stream\r\n\r\n').encode()
+        for _ in range(count):
+            connection = socket.create_connection(('127.0.0.1', port))
+            connection.sendall(request)
+            connection.setblocking(False)
+            self.buffers[connection] = b''
+            self.selector.register(connection, selectors.EVENT_READ)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            for key, _ in self.selector.select(timeout=1):
+                connection = key.fileobj
+                try:
+                    chunk = connection.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.selector.unregister(connection)
+                    continue
+                *lines, self.buffers[connection] = (self.buffers[connection] + chunk).split(b'\n')
+                for line in lines:
+                    if line.startswith(b'data: {"sale_id"'):
+                        created_at = datetime.fromisoformat(json.loads(line[6:])['created_at'])
+                        with self.lock:
+                            self.latencies.append((datetime.utcnow() - created_at).total_seconds())
+
+
+def main():
+    args = parse_args()
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    Config.JOBS_IN_PROCESS = False
+    Config.LIVE_UPDATES = True
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(products=200, customers=100, sales=1000, days=30, seed=42)
+        Product.query.update({Product.quantity_on_hand: Product.quantity_on_hand + 10**6})
+        db.session.commit()
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': BENCH_PASSWORD})
+    master, worker = start_worker(args, database_url)
+    try:
+        baseline = rss_mib(worker)
+        listener = Listener()
+        listener.open(args.port, client.get_cookie('session').value, args.streams)
+        time.sleep(2)
+
+        started, cpu = time.perf_counter(), cpu_seconds(worker)
+        time.sleep(args.idle)
+        idle_cpu = (cpu_seconds(worker) - cpu) / (time.perf_counter() - started)
+        rss = rss_mib(worker)
+
+        rng = random.Random(42)
+        for _ in range(args.sales):
+            cart = [{'product_id': product_id, 'quantity': 1} for product_id in rng.sample(product_ids, 3)]
+            client.post('/sales/add', json={'customer_id': None, 'items': cart})
+            time.sleep(args.interval)
+        time.sleep(args.settle)
+    finally:
+        master.terminate()
+        master.wait()
+
+    with listener.lock:
+        latencies = list(listener.latencies)
+    expected = args.sales * args.streams
+    print(f'{args.streams} idle stream(s) on one gevent worker: {idle_cpu * 100:.2f}% CPU while idle, '
+          f'RSS {rss:.0f} MiB ({(rss - baseline) * 1024 / args.streams:.0f} KiB per stream)')
+    print(f'{args.sales} sale(s) from another process: {len(latencies)}/{expected} event(s) delivered, '
+          f'p50 {percentile(latencies or [0], 50) * 1000:.0f} ms, p95 {percentile(latencies or [0], 95) * 1000:.0f} ms '
+          f'(LIVE_POLL_INTERVAL {app.config["LIVE_POLL_INTERVAL"]:g}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Login throughput benchmark.
+
+Simulates a shift change: many cashiers log in at once on one threaded
+worker while another till keeps browsing. Each password hashing method and
+cost is run with verification on the request threads and on a small
+verification pool (app.passwords), reporting logins per second, login p95
+and the p95 of the other till's requests meanwhile:
+
+    python -m benchmarks.login [--cashiers 12] [--seconds 5] [--methods scrypt:32768:8:1,pbkdf2:sha256:600000]
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, User  # noqa: E402
+from app.passwords import password_hasher  # noqa: E402
+from benchmarks.datagen import generate, BENCH_PASSWORD  # noqa: E402
+from benchmarks.routes import percentile  # noqa: E402
+
+METHODS = 'pbkdf2:sha256:600000,scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:100000'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to run against (defaults to a temporary SQLite file).')
+    parser.add_argument('--cashiers', type=int, default=12, help='Threads logging in at once.')
+    parser.add_argument('--seconds', type=float, default=5, help='Length of each timed run.')
+    parser.add_argument('--methods', default=METHODS, help='Comma-separated Werkzeug hashing methods to compare.')
+    parser.add_argument('--verify-workers', type=int, default=2, help='Verification pool size for the pooled runs.')
+    return parser.parse_args()
+
+
+def cashier(app, username, deadline, latencies, failures):
+    while time.perf_counter() < deadline:
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+        if response.status_code == 302:
+            latencies.append(time.perf_counter() - started)
+        else:
+            failures.append(response.status_code)
+
+
+def browser(app, deadline, latencies):
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': BENCH_PASSWORD})
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        client.get('/api/customers').get_data()
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+
+
+def run(app, method, workers, args):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    app.config['PASSWORD_VERIFY_WORKERS'] = workers
+    password_hasher.configure(app)
+    with app.app_context():
+        # Stored hashes already use the method, so no login rehashes
+        User.query.update({User.password_hash: password_hasher.hash(BENCH_PASSWORD)})
+        db.session.commit()
+        usernames = [row[0] for row in db.session.query(User.username).filter(User.username != 'bench')]
+
+    logins, failures, browsing = [], [], []
+    deadline = time.perf_counter() + args.seconds
+    threads = [threading.Thread(target=browser, args=(app, deadline, browsing))]
+    threads += [threading.Thread(target=cashier, args=(app, username, deadline, logins, failures)) for username in usernames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    line = f'  {method:<24}{workers or "-":>8}{len(logins) / args.seconds:>10.1f}'
+    line += f'{percentile(logins or [0], 95) * 1000:>11.0f}{percentile(browsing or [0], 95) * 1000:>11.1f}'
+    if failures:
+        line += f'  ({len(failures)} failed)'
+    print(line)
+
+
+def main():
+    args = parse_args()
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    Config.JOBS_IN_PROCESS = False
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(users=args.cashiers + 1, products=100, customers=100, sales=100, seed=42)
+
+    print(f'{args.cashiers} cashier(s) logging in for {args.seconds:g}s per run, on {os.cpu_count()} CPU(s)')
+    print(f'  {"method":<24}{"pool":>8}{"logins/s":>10}{"login p95":>11}{"other p95":>11}')
+    for method in args.methods.split(','):
+        for workers in (0, args.verify_workers):
+            run(app, method, workers, args)
+
+
+if __name__ == '__main__':
+    main()
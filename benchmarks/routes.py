@@ -0,0 +1,191 @@
+"""Route latency benchmark.
+
+Generates a synthetic shop (see benchmarks.datagen) and drives the main
+pages and APIs through the Flask test client, reporting p50/p95 latency,
+SQL statements per request and peak Python memory per request.
+
+    python -m benchmarks.routes [--products 2000 --sales 20000] [--save-baseline FILE] [--baseline FILE]
+
+SQLite (a throwaway file unless --database-url is given) is always run. A
+local Postgres is run too when --postgres-url or BENCHMARK_POSTGRES_URL
+points at one that accepts connections; its tables are dropped and refilled.
+With --baseline the results are compared against a saved run, and the exit
+status is 1 if any route got slower (p95) or issues more queries.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models import db, Product  # noqa: E402
+from benchmarks.datagen import generate, BENCH_PASSWORD  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='SQLite (or other) database to run against; defaults to a temporary file.')
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCHMARK_POSTGRES_URL'),
+                        help='Local Postgres to run against as well, if reachable.')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--sales', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=30, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', metavar='FILE', help='Write the results as JSON.')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against results saved earlier.')
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help='Percent p95 slowdown allowed before a route counts as a regression.')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def scenarios(sellable_ids, rng):
+    def add_sale(client):
+        cart = [{'product_id': product_id, 'quantity': 1} for product_id in rng.sample(sellable_ids, 3)]
+        return client.post('/sales/add', json={'customer_id': None, 'items': cart})
+
+    return [
+        ('dashboard', lambda client: client.get('/dashboard')),
+        ('products', lambda client: client.get('/products')),
+        ('stock', lambda client: client.get('/stock')),
+        ('sales', lambda client: client.get('/sales')),
+        ('api_products', lambda client: client.get('/api/products')),
+        ('add_sale', add_sale),
+    ]
+
+
+def run_database(url, args):
+    Config.SQLALCHEMY_DATABASE_URI = url
+    app = create_app()
+    app.config['METRICS_DEBUG_HEADERS'] = True
+    app.config['METRICS_QUERY_LOG_THRESHOLD'] = 0
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        generate(products=args.products, customers=args.customers, sales=args.sales, seed=args.seed)
+        print(f'  generated {args.products} products, {args.sales} sales in {time.perf_counter() - started:.1f}s')
+        # Carts only use products with enough stock for every timed sale
+        needed = args.iterations + args.warmup + 1
+        sellable_ids = [row[0] for row in db.session.query(Product.id).filter(Product.quantity_on_hand >= needed)]
+    from app.search import product_index
+    product_index.invalidate()
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'bench', 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError('could not log in as the benchmark user')
+
+    rng = random.Random(args.seed)
+    results = {}
+    for name, request in scenarios(sellable_ids, rng):
+        for _ in range(args.warmup):
+            request(client)
+
+        latencies = []
+        queries = []
+        errors = 0
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            response = request(client)
+            response.get_data()
+            latencies.append(time.perf_counter() - started)
+            queries.append(int(response.headers.get('X-Query-Count', 0)))
+            errors += response.status_code >= 400
+
+        tracemalloc.start()
+        request(client).get_data()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024),
+            'errors': errors
+        }
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+
+def postgres_available(url):
+    try:
+        engine = create_engine(url)
+        with engine.connect():
+            pass
+        engine.dispose()
+        return True
+    except (ImportError, SQLAlchemyError) as e:
+        print(f'Postgres at {url} not available ({e.__class__.__name__}); skipping')
+        return False
+
+
+def report(label, results, baseline, tolerance):
+    regressions = []
+    print(f'\n{label}')
+    header = f'  {"route":<14}{"p50 ms":>9}{"p95 ms":>9}{"queries":>9}{"peak KiB":>10}'
+    print(header + ('   vs baseline' if baseline else ''))
+    for name, row in results.items():
+        line = f'  {name:<14}{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}{row["queries"]:>9}{row["peak_kib"]:>10}'
+        if row['errors']:
+            line += f'  ({row["errors"]} errors)'
+        previous = (baseline or {}).get(name)
+        if previous:
+            change = (row['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+            line += f'   p95 {change:+.0f}%, queries {row["queries"] - previous["queries"]:+d}'
+            if change > tolerance or row['queries'] > previous['queries']:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    args = parse_args()
+    targets = [('sqlite', args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))]
+    if args.postgres_url and postgres_available(args.postgres_url):
+        targets.append(('postgresql', args.postgres_url))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+
+    all_results = {}
+    regressions = []
+    for label, url in targets:
+        print(f'Database: {url}')
+        all_results[label] = run_database(url, args)
+        regressions += report(label, all_results[label], baseline.get(label), args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as handle:
+            json.dump(all_results, handle, indent=2)
+        print(f'\nSaved results to {args.save_baseline}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
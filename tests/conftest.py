@@ -0,0 +1,36 @@
+import pytest
+from flask_migrate import upgrade
+from app import create_app
+from app.config import Config
+from app.inventory import adjust_on_hand, record_movements
+from app.models import db, Stock, StockMovement
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on a throwaway SQLite file, its schema built by the migrations."""
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "pos.db"}')
+    monkeypatch.setattr(Config, 'SALES_ARCHIVE_DIR', str(tmp_path / 'archive'))
+    monkeypatch.setattr(Config, 'RECEIPT_CACHE_DIR', str(tmp_path / 'receipts'))
+    monkeypatch.setattr(Config, 'JOBS_IN_PROCESS', False)
+    monkeypatch.setattr(Config, 'LIVE_UPDATES', False)
+    app = create_app()
+    with app.app_context():
+        upgrade()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def receive():
+    """Receive a lot of a product the way the stock route does, and commit."""
+    def receive(product_id, quantity):
+        lot = Stock(product_id=product_id, quantity=quantity, unit_cost=1.0)
+        db.session.add(lot)
+        adjust_on_hand(product_id, quantity)
+        db.session.flush()
+        record_movements([{'product_id': product_id, 'kind': StockMovement.RECEIPT, 'quantity': quantity,
+                           'stock_id': lot.id, 'created_at': lot.restock_date}])
+        db.session.commit()
+    return receive
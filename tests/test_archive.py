@@ -0,0 +1,24 @@
+from datetime import date
+from app.archive import archive_month
+from app.checkout import ingest_sales
+from app.models import db, Product, Sale
+
+
+def test_replayed_sales_stay_duplicates_once_archived(app, receive):
+    with app.app_context():
+        product = Product(name='Rice 2kg', cost=2.0, price=3.0)
+        db.session.add(product)
+        db.session.commit()
+        receive(product.id, 10)
+        sale = {'idempotency_key': 'till-1:42', 'created_at': '2025-01-15T10:00:00',
+                'items': [{'product_id': product.id, 'quantity': 2}]}
+
+        [created] = ingest_sales([sale])
+        assert created['status'] == 'created'
+        assert archive_month(date(2025, 1, 1)) == (1, 1)
+        assert Sale.query.count() == 0
+
+        [replayed] = ingest_sales([sale])
+        assert replayed == {'index': 0, 'idempotency_key': 'till-1:42', 'status': 'duplicate',
+                            'sale_id': created['sale_id']}
+        assert db.session.get(Product, product.id).quantity_on_hand == 8
@@ -0,0 +1,51 @@
+import threading
+from app.checkout import CheckoutError, checkout
+from app.inventory import check_stock
+from app.models import db, Product, SaleItem
+
+TILLS = 8
+ATTEMPTS = 5
+UNITS = 3
+STOCK = 20
+
+
+def test_concurrent_checkouts_never_oversell(app, receive):
+    with app.app_context():
+        product = Product(name='Sugar 1kg', cost=1.0, price=1.5)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        receive(product_id, STOCK)
+
+    start = threading.Barrier(TILLS)
+    sold, refused, failures = [], [], []
+
+    def till():
+        with app.app_context():
+            start.wait()
+            for _ in range(ATTEMPTS):
+                try:
+                    checkout(None, [{'product_id': product_id, 'quantity': UNITS}])
+                    db.session.commit()
+                    sold.append(UNITS)
+                except CheckoutError:
+                    db.session.rollback()
+                    refused.append(UNITS)
+                except Exception as e:
+                    db.session.rollback()
+                    failures.append(e)
+
+    threads = [threading.Thread(target=till) for _ in range(TILLS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert len(sold) == STOCK // UNITS
+    with app.app_context():
+        on_hand = db.session.get(Product, product_id).quantity_on_hand
+        assert on_hand >= 0
+        assert on_hand == STOCK - sum(sold)
+        assert db.session.query(db.func.sum(SaleItem.quantity)).scalar() == sum(sold)
+        assert check_stock() == []
@@ -0,0 +1,9 @@
+from app.query_plans import check_query_plans
+
+
+def test_hot_queries_use_their_indexes(app):
+    with app.app_context():
+        results = check_query_plans()
+    assert results
+    unindexed = [(name, index, plan) for name, index, plan, uses_index in results if not uses_index]
+    assert unindexed == []
@@ -0,0 +1,18 @@
+import os
+from app.receipts import ReceiptCache
+
+
+def test_cache_tracks_its_size_and_evicts_least_recently_used(tmp_path):
+    cache = ReceiptCache(str(tmp_path), max_bytes=10_000)
+    for sale_id in range(12):
+        cache.put(sale_id, b'x' * 1000)
+        os.utime(cache.path_for(sale_id), (sale_id, sale_id))
+
+    on_disk = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert cache._total == on_disk <= 10_000
+    assert cache.get(0) is None
+    assert cache.get(11) is not None
+
+    cache.put(11, b'y' * 500)
+    assert cache._total == on_disk - 500
+    assert ReceiptCache(str(tmp_path), max_bytes=10_000)._total == cache._total